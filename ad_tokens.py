@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Managed identity / AD bearer tokens """
+
+import functools
+import threading
+import time
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+
+class AdTokenManager:  # pylint: disable=R0902
+    """
+        Keeps current AD tokens per scope and refreshes them in background before expiry
+
+        Request threads read the cached token and only fall back to a synchronous
+        fetch when no valid token is held (e.g. refresh keeps failing)
+    """
+
+    def __init__(self, credential, refresh_margin=300, retry_interval=10):
+        self.credential = credential
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.min_refresh_interval = 1.0
+        #
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._tokens = {}  # scope -> azure.core.credentials.AccessToken
+        self._refresh_at = {}  # scope -> wall time to refresh held token at
+        self._retry_at = {}  # scope -> monotonic time of next retry after failure
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        #
+        self.refreshes = 0
+        self.failures = 0
+        self.sync_fetches = 0
+        self.last_refresh_latency = None
+        self.last_error = None
+
+    def provider(self, scope):
+        """ Get token provider callable for scope (same contract as get_bearer_token_provider) """
+        self.register(scope)
+        return functools.partial(self.get_token, scope)
+
+    def register(self, scope):
+        """ Start tracking scope """
+        with self._lock:
+            if scope in self._tokens:
+                return
+            self._tokens[scope] = None
+        #
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def get_token(self, scope) -> str:
+        """ Get current token for scope """
+        token = self._tokens.get(scope)
+        if token is not None and token.expires_on > time.time() + 30:
+            return token.token
+        #
+        with self._fetch_lock:
+            token = self._tokens.get(scope)
+            if token is not None and token.expires_on > time.time() + 30:
+                return token.token
+            with self._lock:
+                self.sync_fetches += 1
+            return self._refresh(scope, raise_errors=True).token
+
+    def stop(self):
+        """ Stop background refresh """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def stats(self) -> dict:
+        """ Get refresh counters """
+        now = time.time()
+        with self._lock:
+            return {
+                "scopes": {
+                    scope: token.expires_on - now if token is not None else None
+                    for scope, token in self._tokens.items()
+                },
+                "refreshes": self.refreshes,
+                "failures": self.failures,
+                "sync_fetches": self.sync_fetches,
+                "last_refresh_latency": self.last_refresh_latency,
+                "last_error": self.last_error,
+            }
+
+    def _refresh(self, scope, raise_errors=False):
+        start = time.perf_counter()
+        try:
+            token = self.credential.get_token(scope)
+        except Exception as exc:  # pylint: disable=W0703
+            with self._lock:
+                self.failures += 1
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                self._retry_at[scope] = time.monotonic() + self.retry_interval
+            log.exception("Failed to refresh AD token for scope: %s", scope)
+            if raise_errors:
+                raise
+            return None
+        #
+        with self._lock:
+            self._tokens[scope] = token
+            self._refresh_at[scope] = self._refresh_time(token, time.time())
+            self._retry_at.pop(scope, None)
+            self.refreshes += 1
+            self.last_refresh_latency = time.perf_counter() - start
+        #
+        return token
+
+    def _next_wakeup(self):
+        now = time.time()
+        now_monotonic = time.monotonic()
+        delays = []
+        due = []
+        #
+        with self._lock:
+            for scope, token in self._tokens.items():
+                if scope in self._retry_at:
+                    delay = self._retry_at[scope] - now_monotonic
+                elif token is None:
+                    delay = 0
+                else:
+                    delay = self._refresh_at[scope] - now
+                #
+                if delay <= 0:
+                    due.append(scope)
+                else:
+                    delays.append(max(delay, 1.0))
+        #
+        return due, min(delays) if delays else None
+
+    def _refresh_time(self, token, issued_at):
+        """ Refresh refresh_margin before expiry, at half-life for tokens shorter-lived than margin """
+        lifetime = token.expires_on - issued_at
+        if lifetime > self.refresh_margin:
+            refresh_at = token.expires_on - self.refresh_margin
+        else:
+            refresh_at = issued_at + lifetime / 2
+        # credentials may hand out cached tokens close to (or past) expiry, do not spin on them
+        return max(refresh_at, issued_at + self.min_refresh_interval)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            due, delay = self._next_wakeup()
+            for scope in due:
+                self._refresh(scope)
+            if due:
+                continue
+            #
+            self._wakeup.wait(timeout=delay)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="open_ai_azure_ad_tokens", daemon=True,
+                )
+                self._thread.start()
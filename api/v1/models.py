@@ -45,5 +45,8 @@ class API(api_tools.APIBase):
         if check_connection_response is not True:
             return [{'loc': ['check_connection'], 'msg': check_connection_response}], 400
 
-        models = settings.refresh_models(project_id)
+        # model catalog serves cached list unless client asks to bypass it
+        force_refresh = request.json.get('force_refresh') is True or \
+            request.args.get('force_refresh', '').lower() in ('1', 'true', 'yes')
+        models = settings.refresh_models(project_id, force_refresh=force_refresh)
         return models, 200
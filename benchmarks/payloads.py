@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Benchmark: payload normalization vs JSON round trip """
+
+import json
+
+from ..payloads import normalize_payload
+from .tokens import best_of, history
+
+
+def main():
+    """ Run benchmark """
+    messages = history(200)
+    attachment = [{
+        "role": "user",
+        "content": [
+            {"type": "text", "text": "see file"},
+            {"type": "image_url", "image_url": {"url": "data:image/png;base64," + "A" * (5 * 1024 * 1024)}},
+        ],
+    }]
+    #
+    print("best of 5")
+    for label, data in [
+            ("200 messages", messages),
+            ("5 MB attachment", attachment),
+            ("200 msgs + 5 MB attachment", messages + attachment),
+    ]:
+        assert normalize_payload(data) == json.loads(json.dumps(data))
+        round_trip = best_of(lambda: json.loads(json.dumps(data)))  # pylint: disable=W0640
+        normalized = best_of(lambda: normalize_payload(data))  # pylint: disable=W0640
+        print(f"  {label:28s} json round trip {round_trip * 1000:8.2f} ms, normalize_payload {normalized * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+    Benchmark: warm client reuse behind descriptor routing keys
+
+    Measures what a worker saves by keeping one client per routing key: client
+    construction (incl. default SSL context) and a new TLS connection per call.
+    Needs openssl CLI for a throwaway self-signed certificate
+"""
+
+import json
+import os
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx  # pylint: disable=E0401
+import openai  # pylint: disable=E0401
+
+from ..methods.callbacks import _routing_key
+
+BODY = json.dumps({
+    "id": "x", "object": "chat.completion", "created": 1, "model": "gpt-4",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "Hi!"}}],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+}).encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):  # pylint: disable=C0103
+        """ Answer any call with fixed chat completion """
+        self.rfile.read(int(self.headers["content-length"]))
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+
+def _serve_tls(workdir):
+    cert = os.path.join(workdir, "cert.pem")
+    key = os.path.join(workdir, "key.pem")
+    subprocess.run([
+        "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+        "-keyout", key, "-out", cert, "-subj", "/CN=localhost",
+        "-addext", "subjectAltName=DNS:localhost",
+    ], check=True, capture_output=True)
+    #
+    server = ThreadingHTTPServer(("localhost", 0), _Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"https://localhost:{server.server_address[1]}", cert
+
+
+def main(count=200):
+    """ Run benchmark """
+    with tempfile.TemporaryDirectory() as workdir:
+        server, api_base, cert = _serve_tls(workdir)
+        verify = ssl.create_default_context(cafile=cert)
+        #
+        def _client(http_client=None):
+            return openai.AzureOpenAI(
+                azure_endpoint=api_base, api_version="2024-02-01", api_key="key", max_retries=0,
+                http_client=http_client,
+            )
+        #
+        def _call(client):
+            client.chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": "x"}])
+        #
+        def _per_call(function, number=count):
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            return (time.perf_counter() - start) / number * 1000
+        #
+        def _cold():
+            client = _client(httpx.Client(verify=verify))
+            _call(client)
+            client.close()
+        #
+        construct = _per_call(_client, 50)  # default http client, certifi SSL context
+        cold = _per_call(_cold)
+        warm_client = _client(httpx.Client(verify=verify))
+        _call(warm_client)
+        warm = _per_call(lambda: _call(warm_client))
+        warm_client.close()
+        server.shutdown()
+    #
+    target_kwargs = {
+        "model": "gpt-4", "max_tokens": 512, "temperature": 0.0,
+        "azure_endpoint": api_base, "api_version": "2024-02-01", "api_key": "key",
+    }
+    start = time.perf_counter()
+    for _ in range(10000):
+        _routing_key("langchain_openai.chat_models.azure.AzureChatOpenAI", target_kwargs)
+    routing = (time.perf_counter() - start) / 10000 * 1000
+    #
+    print(f"  AzureOpenAI() with default http client  {construct:8.2f} ms")
+    print(f"  new client + TLS handshake + call       {cold:8.2f} ms")
+    print(f"  call on warm client                     {warm:8.2f} ms")
+    print(f"  routing key                             {routing * 1000:8.2f} us")
+    print(f"  saved per call by warm client           {construct + cold - warm:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Benchmark: message token counting """
+
+import random
+import string
+import time
+
+import tiktoken
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from ..tokens import count_message_tokens, encoded_lengths, get_tokenizer, token_memo
+
+
+def reference_num_tokens(messages: list, model: str) -> int:
+    """ Per-call resolution and per-value encoding, as num_tokens_from_messages did before """
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    if model in {"gpt-4-0613"}:
+        tokens_per_message, tokens_per_name = 3, 1
+    elif "gpt-4" in model:
+        log.warning("Warning: gpt-4 may update over time. Returning num tokens assuming gpt-4-0613.")
+        return reference_num_tokens(messages, "gpt-4-0613")
+    else:
+        tokens_per_message, tokens_per_name = 4, -1
+    num_tokens = 0
+    for message in messages:
+        num_tokens += tokens_per_message
+        for key, value in message.items():
+            num_tokens += len(encoding.encode(value))
+            if key == "name":
+                num_tokens += tokens_per_name
+    return num_tokens
+
+
+def history(size, seed=1) -> list:
+    """ Make synthetic conversation of 20-200 word messages """
+    rnd = random.Random(seed)
+    #
+    def _text():
+        return " ".join(
+            "".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(2, 9)))
+            for _ in range(rnd.randint(20, 200))
+        )
+    #
+    return [
+        {"role": "user" if idx % 2 == 0 else "assistant", "content": _text()}
+        for idx in range(size)
+    ]
+
+
+def best_of(function, repeat=5) -> float:
+    """ Get best wall time of function(), seconds """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    """ Run benchmark """
+    model = "gpt-4"
+    messages = history(1000)
+    texts = [value for message in messages for value in message.values()]
+    encoding = get_tokenizer(model).encoding
+    token_memo.max_entries = 0  # measure tokenization, not the memo
+    #
+    assert count_message_tokens(messages, model) == reference_num_tokens(messages, model)
+    #
+    cases = [
+        ("reference, whole list", lambda: reference_num_tokens(messages, model)),
+        ("count_message_tokens, whole list", lambda: count_message_tokens(messages, model)),
+        ("reference, one call per message", lambda: [reference_num_tokens([item], model) for item in messages]),
+        ("count_message_tokens, one call per message", lambda: [count_message_tokens([item], model) for item in messages]),
+        ("encoded_lengths (plain loop)", lambda: encoded_lengths(encoding, texts)),
+        ("encoding.encode_batch", lambda: [len(item) for item in encoding.encode_batch(texts)]),
+    ]
+    print(f"{len(messages)} messages, encoding {encoding.name}, best of 5")
+    for name, function in cases:
+        print(f"  {name:45s} {best_of(function) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
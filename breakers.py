@@ -0,0 +1,243 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Circuit breakers """
+
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from .retries import classify_error
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    """ All endpoints of deployment have open circuits """
+
+
+class Permit(NamedTuple):
+    """ Call let through by acquire(), probe calls hold a half-open slot of one opening """
+    probe: bool = False
+    opening: int = 0
+
+
+PASS = Permit()
+
+
+def is_endpoint_failure(exc) -> bool:
+    """ Errors that indicate endpoint degradation (429 is quota, handled by rate limiter) """
+    classified = classify_error(exc)
+    return classified is not None and classified[0] != "429"
+
+
+class _Breaker:  # pylint: disable=R0902,R0903
+    def __init__(self):
+        self.state = CLOSED
+        self.outcomes = deque()  # (time, failed, slow)
+        self.failures = 0
+        self.slow = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.probe_successes = 0
+        self.opened = 0
+        self.rejected = 0
+
+
+class CircuitBreakers:  # pylint: disable=R0902
+    """
+        Circuit breaker per (api_base, deployment)
+
+        Opens when, over the last window seconds (at least min_requests calls), error rate
+        reaches error_rate or rate of calls slower than slow_call_seconds reaches slow_rate.
+        Open circuits reject calls for open_seconds, then let half_open_probes probe calls
+        through; their successes close the circuit, a failure opens it again
+    """
+
+    def __init__(  # pylint: disable=R0913
+            self, enabled=False, window=30.0, min_requests=10, error_rate=0.5,
+            slow_call_seconds=None, slow_rate=0.8, open_seconds=30.0, half_open_probes=1,
+    ):
+        self.enabled = enabled
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        #
+        self._lock = threading.Lock()
+        self._breakers = {}  # (api_base, deployment) -> _Breaker
+
+    def configure(self, config: dict):
+        """ Apply breaker config, resets all circuits """
+        with self._lock:
+            for key in [
+                    "enabled", "window", "min_requests", "error_rate", "slow_call_seconds",
+                    "slow_rate", "open_seconds", "half_open_probes",
+            ]:
+                if key in config:
+                    setattr(self, key, config[key])
+            self._breakers.clear()
+
+    def available(self, api_base, deployment) -> bool:
+        """ Check (without taking probe slot) if circuit would let a call through now """
+        if not self.enabled:
+            return True
+        with self._lock:
+            breaker = self._breakers.get((api_base, deployment))
+            if breaker is None or breaker.state == CLOSED:
+                return True
+            if breaker.state == OPEN:
+                return time.monotonic() >= breaker.opened_at + self.open_seconds
+            return breaker.probes < self.half_open_probes
+
+    def acquire(self, api_base, deployment):
+        """ Let call through (taking probe slot when half-open), None when rejected """
+        if not self.enabled:
+            return PASS
+        with self._lock:
+            breaker = self._breaker(api_base, deployment)
+            if breaker.state == OPEN:
+                if time.monotonic() < breaker.opened_at + self.open_seconds:
+                    breaker.rejected += 1
+                    return None
+                breaker.state = HALF_OPEN
+                breaker.probes = 0
+                breaker.probe_successes = 0
+                log.info("Circuit half-open: %s %s", api_base, deployment)
+            if breaker.state == HALF_OPEN:
+                if breaker.probes >= self.half_open_probes:
+                    breaker.rejected += 1
+                    return None
+                breaker.probes += 1
+                return Permit(True, breaker.opened)
+            return PASS
+
+    def record(self, api_base, deployment, failed: bool, latency: float, permit=PASS):  # pylint: disable=R0913
+        """ Record outcome of call let through by acquire() """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        slow = self.slow_call_seconds is not None and latency >= self.slow_call_seconds
+        #
+        with self._lock:
+            breaker = self._breaker(api_base, deployment)
+            #
+            if breaker.state == HALF_OPEN:
+                if not self._holds_probe(breaker, permit):
+                    return  # late result of call started before this half-open phase
+                breaker.probes = max(breaker.probes - 1, 0)
+                if failed or slow:
+                    self._open(breaker, api_base, deployment, now)
+                else:
+                    breaker.probe_successes += 1
+                    if breaker.probe_successes >= self.half_open_probes:
+                        breaker.state = CLOSED
+                        breaker.outcomes.clear()
+                        breaker.failures = 0
+                        breaker.slow = 0
+                        log.info("Circuit closed: %s %s", api_base, deployment)
+                return
+            #
+            if breaker.state == OPEN:
+                return  # late result of call started before opening
+            #
+            breaker.outcomes.append((now, failed, slow))
+            breaker.failures += failed
+            breaker.slow += slow
+            while breaker.outcomes and breaker.outcomes[0][0] < now - self.window:
+                _, old_failed, old_slow = breaker.outcomes.popleft()
+                breaker.failures -= old_failed
+                breaker.slow -= old_slow
+            #
+            total = len(breaker.outcomes)
+            if total >= self.min_requests and (
+                    breaker.failures / total >= self.error_rate or
+                    breaker.slow / total >= self.slow_rate
+            ):
+                self._open(breaker, api_base, deployment, now)
+
+    def release(self, api_base, deployment, permit):
+        """ Give back probe slot of call cancelled without outcome (e.g. lost hedge) """
+        if not self.enabled:
+            return
+        with self._lock:
+            breaker = self._breakers.get((api_base, deployment))
+            if breaker is not None and breaker.state == HALF_OPEN and \
+                    self._holds_probe(breaker, permit):
+                breaker.probes = max(breaker.probes - 1, 0)
+
+    def states(self) -> dict:
+        """ Get circuit states """
+        now = time.monotonic()
+        with self._lock:
+            result = {}
+            for (api_base, deployment), breaker in self._breakers.items():
+                total = len(breaker.outcomes)
+                result[f"{api_base}|{deployment}"] = {
+                    "state": breaker.state,
+                    "requests": total,
+                    "error_rate": breaker.failures / total if total else 0.0,
+                    "slow_rate": breaker.slow / total if total else 0.0,
+                    "open_for": max(breaker.opened_at + self.open_seconds - now, 0.0)
+                    if breaker.state == OPEN else 0.0,
+                    "opened": breaker.opened,
+                    "rejected": breaker.rejected,
+                }
+            return result
+
+    def stats(self) -> dict:
+        """ Get breaker counters """
+        states = self.states()
+        return {
+            "enabled": self.enabled,
+            "open": sum(1 for item in states.values() if item["state"] != CLOSED),
+            "opened": sum(item["opened"] for item in states.values()),
+            "rejected": sum(item["rejected"] for item in states.values()),
+        }
+
+    def _breaker(self, api_base, deployment) -> _Breaker:
+        breaker = self._breakers.get((api_base, deployment))
+        if breaker is None:
+            breaker = _Breaker()
+            self._breakers[(api_base, deployment)] = breaker
+        return breaker
+
+    @staticmethod
+    def _holds_probe(breaker, permit) -> bool:
+        # probe slots of earlier half-open phases were reset when circuit reopened
+        return permit.probe and permit.opening == breaker.opened
+
+    def _open(self, breaker, api_base, deployment, now):
+        breaker.state = OPEN
+        breaker.opened_at = now
+        breaker.opened += 1
+        breaker.outcomes.clear()
+        breaker.failures = 0
+        breaker.slow = 0
+        log.warning("Circuit opened: %s %s", api_base, deployment)
+
+
+circuit_breakers = CircuitBreakers()
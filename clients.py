@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" OpenAI client pool """
+
+import hashlib
+import threading
+import time
+
+import httpx  # pylint: disable=E0401
+from openai import AzureOpenAI, AsyncAzureOpenAI  # pylint: disable=E0401
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from .engine import async_engine
+
+
+def credential_fingerprint(credential) -> str:
+    """ Make non-reversible short id of a credential """
+    if credential is None:
+        return "ad"
+    return hashlib.sha256(credential.encode()).hexdigest()[:16]
+
+
+class ClientPool:  # pylint: disable=R0902
+    """
+        Long-lived AzureOpenAI clients keyed by (api_base, api_version, credential fingerprint)
+
+        All clients share one keep-alive httpx transport, so connections and TLS
+        sessions are reused across requests and integrations
+    """
+
+    def __init__(self, client_class=AzureOpenAI, http_client_class=httpx.Client):
+        self.client_class = client_class
+        self.http_client_class = http_client_class
+        #
+        self.max_connections = 100
+        self.max_keepalive_connections = 20
+        self.keepalive_expiry = 30.0
+        self.timeout = 600.0
+        self.max_clients = 256
+        self.idle_timeout = 3600.0
+        self.max_retries = None  # SDK default unless set
+        #
+        self._lock = threading.Lock()
+        self._http_client = None
+        self._clients = {}  # key -> [client, last_used]
+        self._last_sweep = time.monotonic()
+        #
+        self.hits = 0
+        self.created = 0
+        self.evicted = 0
+
+    def configure(self, config: dict):
+        """ Apply pool config, existing clients are dropped """
+        self.close()
+        #
+        with self._lock:
+            for key in [
+                    "max_connections", "max_keepalive_connections", "keepalive_expiry",
+                    "timeout", "max_clients", "idle_timeout", "max_retries",
+            ]:
+                if key in config:
+                    setattr(self, key, config[key])
+
+    def get(self, api_base, api_version, api_key=None, azure_ad_token_provider=None):
+        """ Get pooled client, api_key or azure_ad_token_provider must be set """
+        key = (api_base, api_version, credential_fingerprint(api_key))
+        now = time.monotonic()
+        #
+        with self._lock:
+            self._sweep(now)
+            #
+            entry = self._clients.get(key)
+            if entry is not None:
+                self.hits += 1
+                entry[1] = now
+                return entry[0]
+            #
+            if self._http_client is None:
+                self._http_client = self.http_client_class(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_keepalive_connections,
+                        keepalive_expiry=self.keepalive_expiry,
+                    ),
+                    timeout=self.timeout,
+                )
+            #
+            client_kwargs = {
+                "azure_endpoint": api_base,
+                "api_version": api_version,
+                "http_client": self._http_client,
+            }
+            if self.max_retries is not None:
+                client_kwargs["max_retries"] = self.max_retries
+            if api_key is not None:
+                client_kwargs["api_key"] = api_key
+            else:
+                client_kwargs["azure_ad_token_provider"] = azure_ad_token_provider
+            #
+            client = self.client_class(**client_kwargs)
+            self._clients[key] = [client, now]
+            self.created += 1
+            #
+            if len(self._clients) > self.max_clients:
+                oldest = min(self._clients, key=lambda item: self._clients[item][1])
+                self._clients.pop(oldest)
+                self.evicted += 1
+            #
+            return client
+
+    def close(self):
+        """ Drop all clients and close shared transport """
+        http_client = self._detach()
+        if http_client is None:
+            return
+        #
+        if isinstance(http_client, httpx.AsyncClient):
+            # connections belong to engine loop, close transport there
+            async_engine.call_soon(http_client.aclose)
+            return
+        #
+        try:
+            http_client.close()
+        except:  # pylint: disable=W0702
+            log.exception("Failed to close shared HTTP client")
+
+    async def aclose(self):
+        """ Drop all clients and close shared async transport, call on owning loop """
+        http_client = self._detach()
+        #
+        if http_client is not None:
+            try:
+                await http_client.aclose()
+            except:  # pylint: disable=W0702
+                log.exception("Failed to close shared HTTP client")
+
+    def _detach(self):
+        with self._lock:
+            self._clients.clear()
+            http_client, self._http_client = self._http_client, None
+        return http_client
+
+    def stats(self) -> dict:
+        """ Get pool counters """
+        with self._lock:
+            return {
+                "size": len(self._clients),
+                "hits": self.hits,
+                "created": self.created,
+                "evicted": self.evicted,
+            }
+
+    def _sweep(self, now):
+        # Clients only hold config, the shared transport stays open
+        if now - self._last_sweep < min(60.0, self.idle_timeout):
+            return
+        self._last_sweep = now
+        #
+        for key in [
+                key for key, (_, last_used) in self._clients.items()
+                if now - last_used > self.idle_timeout
+        ]:
+            self._clients.pop(key)
+            self.evicted += 1
+
+
+client_pool = ClientPool()
+# clients are created on calling threads (init_clients), requests run on engine loop
+async_client_pool = ClientPool(AsyncAzureOpenAI, httpx.AsyncClient)
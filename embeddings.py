@@ -0,0 +1,492 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Embeddings """
+
+import base64
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    import numpy as np  # pylint: disable=E0401
+except ImportError:  # pragma: no cover
+    np = None
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+from tools import context  # pylint: disable=E0611,E0401
+
+from .clients import client_pool, credential_fingerprint
+from .retries import retry_policy
+from .tokens import get_tokenizer, encoded_lengths
+
+
+def embedding_key(model, dimensions, text) -> bytes:
+    """ Make content-addressed cache key """
+    digest = hashlib.sha256()
+    digest.update(f"{model}\0{dimensions}\0".encode())
+    digest.update(text.encode())
+    return digest.digest()
+
+
+class EmbeddingCache:  # pylint: disable=R0902
+    """
+        Two-tier embedding cache keyed by (model, dimensions, sha256(text))
+
+        Memory tier is an LRU bounded by vector bytes, optional persistent tier is sqlite.
+        Vectors are stored as packed float32, the precision Azure computes them in
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.max_memory_bytes = 256 * 1024 * 1024
+        self.sqlite_path = None
+        #
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._db = None
+        #
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def configure(self, config: dict):
+        """ Apply cache config """
+        self.close()
+        #
+        with self._lock:
+            self.enabled = config.get("enabled", self.enabled)
+            self.max_memory_bytes = config.get("max_memory_bytes", self.max_memory_bytes)
+            self.sqlite_path = config.get("sqlite_path", self.sqlite_path)
+            #
+            if self.enabled and self.sqlite_path:
+                self._db = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+                )
+                self._db.commit()
+
+    def get_many(self, keys: list, texts: list) -> list:
+        """ Get vectors for keys, None for misses """
+        result = [None] * len(keys)
+        if not self.enabled:
+            return result
+        #
+        disk_lookup = []
+        with self._lock:
+            for idx, key in enumerate(keys):
+                packed = self._memory.get(key)
+                if packed is not None:
+                    self._memory.move_to_end(key)
+                    result[idx] = packed
+                    self.memory_hits += 1
+                elif self._db is not None:
+                    disk_lookup.append(idx)
+                else:
+                    self.misses += 1
+            #
+            for start in range(0, len(disk_lookup), 500):
+                chunk = disk_lookup[start:start + 500]
+                rows = dict(self._db.execute(
+                    "SELECT key, vector FROM embeddings WHERE key IN (%s)" % ",".join("?" * len(chunk)),
+                    [keys[idx] for idx in chunk],
+                ).fetchall())
+                for idx in chunk:
+                    packed = rows.get(keys[idx])
+                    if packed is None:
+                        self.misses += 1
+                        continue
+                    result[idx] = packed
+                    self.disk_hits += 1
+                    self._remember(keys[idx], packed)
+            #
+            for idx, packed in enumerate(result):
+                if packed is not None:
+                    self.bytes_saved += len(texts[idx].encode()) + len(packed)
+        #
+        return [_unpack(packed) if packed is not None else None for packed in result]
+
+    def put_many(self, items):
+        """ Store (key, packed vector) pairs, see _pack() """
+        if not self.enabled:
+            return
+        #
+        packed_items = list(items)
+        with self._lock:
+            for key, packed in packed_items:
+                self._remember(key, packed)
+            #
+            if self._db is not None:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                        packed_items,
+                    )
+                    self._db.commit()
+                except sqlite3.Error:
+                    log.exception("Failed to persist embeddings")
+
+    def close(self):
+        """ Drop memory tier and close persistent tier """
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            db, self._db = self._db, None
+        #
+        if db is not None:
+            db.close()
+
+    def stats(self) -> dict:
+        """ Get cache counters """
+        with self._lock:
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+                "bytes_saved": self.bytes_saved,
+            }
+
+    def _remember(self, key, packed):
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        #
+        self._memory[key] = packed
+        self._memory_bytes += len(packed)
+        #
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_bytes -= len(dropped)
+
+
+def _pack(vector) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(packed) -> list:
+    vector = array("f")
+    vector.frombytes(packed)
+    return vector.tolist()
+
+
+OUTPUT_FORMATS = ["list", "float32", "float16", "base64"]
+
+
+def format_embeddings(vectors: list, output_format: str = "list"):
+    """
+        Convert vectors to requested output format:
+        list - lists of floats (default), float32 / float16 - one 2-D ndarray for all vectors,
+        base64 - base64 of little-endian float32 bytes per vector (compact wire format)
+    """
+    if output_format == "list":
+        return vectors
+    #
+    if output_format == "base64":
+        result = []
+        for vector in vectors:
+            packed = array("f", vector)
+            if packed.itemsize != 4 or array("H", [1]).tobytes() != b"\x01\x00":
+                raise RuntimeError("base64 output needs little-endian 32-bit floats")
+            result.append(base64.b64encode(packed.tobytes()).decode())
+        return result
+    #
+    if output_format in ("float32", "float16"):
+        if np is None:
+            raise RuntimeError(f"{output_format} output requires numpy")
+        return np.asarray(vectors, dtype=output_format)
+    #
+    raise ValueError(f"Unknown output format: {output_format}, expected one of {OUTPUT_FORMATS}")
+
+
+def embedding_dimensions(settings: dict):
+    """ Get requested vector size (text-embedding-3 models), explicit dimensions wins """
+    if settings.get("dimensions") is not None:
+        return settings["dimensions"]
+    return settings["integration_data"]["settings"].get("embedding_dimensions")
+
+
+embedding_cache = EmbeddingCache()
+
+
+def _embedding_client(settings: dict):
+    integration_settings = settings["integration_data"]["settings"]
+    #
+    module = context.module_manager.module.open_ai_azure
+    if module.ad_token_provider is None:
+        return client_pool.get(
+            integration_settings["api_base"], integration_settings["api_version"],
+            api_key=integration_settings["api_token"],
+        )
+    return client_pool.get(
+        integration_settings["api_base"], integration_settings["api_version"],
+        azure_ad_token_provider=module.ad_token_provider,
+    )
+
+
+class EmbeddingBatcher:
+    """
+        Packs texts into upstream requests bounded by input count and total tokens
+        and dispatches them concurrently
+    """
+
+    def __init__(self):
+        self.max_inputs = 2048
+        self.max_tokens = 250000
+        self.parallelism = 4
+        #
+        self._lock = threading.Lock()
+        self._executor = None
+        #
+        self.requests = 0
+        self.inputs = 0
+
+    def configure(self, config: dict):
+        """ Apply batcher config """
+        self.close()
+        #
+        with self._lock:
+            self.max_inputs = config.get("max_inputs", self.max_inputs)
+            self.max_tokens = config.get("max_tokens", self.max_tokens)
+            self.parallelism = config.get("parallelism", self.parallelism)
+
+    def plan(self, texts: list, model: str) -> list:
+        """ Split text indexes into batches """
+        lengths = encoded_lengths(get_tokenizer(model).encoding, texts)
+        #
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for idx, length in enumerate(lengths):
+            if batch and (len(batch) >= self.max_inputs or batch_tokens + length > self.max_tokens):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(idx)
+            batch_tokens += length
+        if batch:
+            batches.append(batch)
+        #
+        return batches
+
+    def embed(self, client, params: dict, texts: list) -> list:
+        """ Embed texts in planned batches, results in input order """
+        batches = self.plan(texts, params["model"])
+        #
+        def _embed_batch(batch):
+            response = retry_policy.call(
+                lambda: client.embeddings.create(input=[texts[idx] for idx in batch], **params)
+            )
+            return batch, response.data
+        #
+        if len(batches) == 1 or self.parallelism < 2:
+            results = map(_embed_batch, batches)
+        else:
+            results = self._get_executor().map(_embed_batch, batches)
+        #
+        vectors = [None] * len(texts)
+        for batch, data in results:
+            for item in data:
+                vectors[batch[item.index]] = item.embedding
+        #
+        with self._lock:
+            self.requests += len(batches)
+            self.inputs += len(texts)
+        #
+        return vectors
+
+    def close(self):
+        """ Stop dispatch threads """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        """ Get batcher counters """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "inputs": self.inputs,
+                "average_batch_size": self.inputs / self.requests if self.requests else 0.0,
+            }
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.parallelism, thread_name_prefix="open_ai_azure_embeddings",
+                )
+            return self._executor
+
+
+embedding_batcher = EmbeddingBatcher()
+
+
+def embed_documents(settings: dict, texts: list, output_format: str = "list"):
+    """ Embed texts, only unique cache misses are sent upstream (settings as in embed callbacks) """
+    model = settings["model_name"]
+    dimensions = embedding_dimensions(settings)
+    #
+    keys = [embedding_key(model, dimensions, text) for text in texts]
+    vectors = embedding_cache.get_many(keys, texts)
+    #
+    missing = {}  # key -> indexes of identical texts
+    for idx, vector in enumerate(vectors):
+        if vector is None:
+            missing.setdefault(keys[idx], []).append(idx)
+    #
+    if missing:
+        params = {
+            "model": model,
+        }
+        if dimensions is not None:
+            params["dimensions"] = dimensions
+        #
+        unique = list(missing.values())
+        embedded = embedding_batcher.embed(
+            _embedding_client(settings), params, [texts[indexes[0]] for indexes in unique],
+        )
+        # misses are returned in cached float32 precision too, so results do not depend on cache state
+        packed = [_pack(vector) for vector in embedded]
+        for indexes, packed_vector in zip(unique, packed):
+            for idx in indexes:
+                vectors[idx] = _unpack(packed_vector)
+        #
+        embedding_cache.put_many(
+            (keys[indexes[0]], packed_vector) for indexes, packed_vector in zip(unique, packed)
+        )
+    #
+    return format_embeddings(vectors, output_format)
+
+
+class _QueryGroup:  # pylint: disable=R0903
+    def __init__(self, settings):
+        self.settings = settings
+        self.items = []  # (text, future)
+        self.full = threading.Event()
+
+
+class QueryCoalescer:
+    """
+        Collects concurrent embed_query calls for the same deployment and credentials
+        within a short window (or until max_batch) and embeds them in one call
+
+        The first caller of a window leads: it waits for the window, sends the batch
+        and fans vectors out to the other waiting callers
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.window = 0.005
+        self.max_batch = 64
+        #
+        self._lock = threading.Lock()
+        self._pending = {}
+        #
+        self.batches = 0
+        self.queries = 0
+        self.max_batch_seen = 0
+        self.batch_sizes = {}  # batch size -> count
+
+    def configure(self, config: dict):
+        """ Apply coalescer config """
+        with self._lock:
+            self.enabled = config.get("enabled", self.enabled)
+            self.window = config.get("window_ms", self.window * 1000) / 1000
+            self.max_batch = config.get("max_batch", self.max_batch)
+
+    def embed(self, settings: dict, text: str) -> list:
+        """ Embed text as part of a coalesced batch """
+        integration_settings = settings["integration_data"]["settings"]
+        key = (
+            integration_settings["api_base"], integration_settings["api_version"],
+            credential_fingerprint(integration_settings.get("api_token")),
+            settings["model_name"], embedding_dimensions(settings),
+        )
+        future = Future()
+        #
+        with self._lock:
+            group = self._pending.get(key)
+            leader = group is None
+            if leader:
+                group = _QueryGroup(settings)
+                self._pending[key] = group
+            group.items.append((text, future))
+            if len(group.items) >= self.max_batch:
+                self._pending.pop(key)
+                group.full.set()
+        #
+        if leader:
+            group.full.wait(self.window)
+            with self._lock:
+                if self._pending.get(key) is group:
+                    self._pending.pop(key)
+            self._flush(group)
+        #
+        return future.result()
+
+    def stats(self) -> dict:
+        """ Get achieved batch size metrics """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "batches": self.batches,
+                "queries": self.queries,
+                "average_batch_size": self.queries / self.batches if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            }
+
+    def _flush(self, group):
+        size = len(group.items)
+        with self._lock:
+            self.batches += 1
+            self.queries += size
+            self.max_batch_seen = max(self.max_batch_seen, size)
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+        #
+        try:
+            vectors = embed_documents(group.settings, [text for text, _ in group.items])
+        except BaseException as exc:  # pylint: disable=W0703
+            for _, future in group.items:
+                future.set_exception(exc)
+            return
+        #
+        for (_, future), vector in zip(group.items, vectors):
+            future.set_result(vector)
+
+
+query_coalescer = QueryCoalescer()
+
+
+def embed_query(settings: dict, text: str, output_format: str = "list"):
+    """ Embed single text, coalesced with concurrent queries when enabled """
+    if not query_coalescer.enabled:
+        return embed_documents(settings, [text], output_format)[0]
+    #
+    return format_embeddings([query_coalescer.embed(settings, text)], output_format)[0]
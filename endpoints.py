@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Endpoint pools """
+
+import threading
+import time
+from asyncio import CancelledError
+from contextlib import contextmanager
+from typing import NamedTuple, Any
+
+
+STRATEGIES = ("weighted_round_robin", "least_outstanding")
+
+
+class Endpoint(NamedTuple):
+    """ One Azure OpenAI resource serving a deployment """
+    api_base: str
+    api_version: str
+    api_token: Any  # secret reference / value, None with AD auth
+    weight: int = 1
+
+
+def endpoint_pool(settings: dict, deployment: str) -> list:
+    """
+        Get endpoints of (merged) settings dict serving deployment
+
+        Primary api_base always comes first with weight 1. Entries of settings "endpoints"
+        inherit api_version / api_token from primary and may be limited to some deployments
+    """
+    primary = Endpoint(settings["api_base"], settings["api_version"], settings.get("api_token"))
+    result = [primary]
+    for item in settings.get("endpoints") or []:
+        deployments = item.get("deployments")
+        if deployments and deployment not in deployments:
+            continue
+        result.append(Endpoint(
+            item["api_base"],
+            item.get("api_version") or primary.api_version,
+            item.get("api_token") or primary.api_token,
+            item.get("weight", 1),
+        ))
+    return result
+
+
+class _EndpointState:  # pylint: disable=R0903
+    def __init__(self):
+        self.outstanding = 0
+        self.latency = None  # EWMA, seconds
+        self.requests = 0
+        self.errors = 0
+
+
+class EndpointBalancer:  # pylint: disable=R0902
+    """
+        Picks endpoint of a pool per request
+
+        weighted_round_robin is smooth WRR (nginx): traffic split by weight without bursts.
+        least_outstanding picks min of (in flight + 1) * EWMA latency / weight, so slow or
+        busy endpoints get less traffic. Descriptor paths (no completion feedback) always
+        use weighted round-robin
+    """
+
+    def __init__(self, strategy="weighted_round_robin", latency_decay=0.2):
+        self.strategy = strategy
+        self.latency_decay = latency_decay
+        #
+        self._lock = threading.Lock()
+        self._states = {}  # (api_base, deployment) -> _EndpointState
+        self._current_weights = {}  # (deployment, api_bases) -> list of smooth WRR weights
+
+    def configure(self, config: dict):
+        """ Apply balancer config """
+        strategy = config.get("strategy", self.strategy)
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown endpoint strategy: {strategy}, expected one of {STRATEGIES}")
+        self.strategy = strategy
+        self.latency_decay = config.get("latency_decay", self.latency_decay)
+
+    def choose(self, endpoints: list, deployment: str, strategy=None):
+        """ Pick endpoint (index) for next request """
+        if len(endpoints) == 1:
+            return 0
+        #
+        strategy = strategy or self.strategy
+        with self._lock:
+            if strategy == "least_outstanding":
+                return self._least_outstanding(endpoints, deployment)
+            return self._weighted_round_robin(endpoints, deployment)
+
+    @contextmanager
+    def track(self, endpoint: Endpoint, deployment: str):
+        """ Account in-flight request to endpoint and its latency """
+        with self._lock:
+            state = self._state(endpoint.api_base, deployment)
+            state.outstanding += 1
+            state.requests += 1
+        #
+        start = time.perf_counter()
+        try:
+            yield
+        except CancelledError:
+            with self._lock:
+                state.outstanding -= 1
+            raise
+        except:  # pylint: disable=W0702
+            with self._lock:
+                state.outstanding -= 1
+                state.errors += 1
+            raise
+        #
+        latency = time.perf_counter() - start
+        with self._lock:
+            state.outstanding -= 1
+            if state.latency is None:
+                state.latency = latency
+            else:
+                state.latency += self.latency_decay * (latency - state.latency)
+
+    def stats(self) -> dict:
+        """ Get per endpoint counters """
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "endpoints": {
+                    f"{api_base}|{deployment}": {
+                        "outstanding": state.outstanding,
+                        "latency": state.latency,
+                        "requests": state.requests,
+                        "errors": state.errors,
+                    }
+                    for (api_base, deployment), state in self._states.items()
+                },
+            }
+
+    def _state(self, api_base, deployment) -> _EndpointState:
+        state = self._states.get((api_base, deployment))
+        if state is None:
+            state = _EndpointState()
+            self._states[(api_base, deployment)] = state
+        return state
+
+    def _weighted_round_robin(self, endpoints, deployment):
+        key = (deployment, tuple(endpoint.api_base for endpoint in endpoints))
+        current = self._current_weights.get(key)
+        if current is None:
+            current = [0] * len(endpoints)
+            self._current_weights[key] = current
+        #
+        total = 0
+        best = 0
+        for idx, endpoint in enumerate(endpoints):
+            current[idx] += endpoint.weight
+            total += endpoint.weight
+            if current[idx] > current[best]:
+                best = idx
+        current[best] -= total
+        return best
+
+    def _least_outstanding(self, endpoints, deployment):
+        states = [self._state(endpoint.api_base, deployment) for endpoint in endpoints]
+        known = [state.latency for state in states if state.latency is not None]
+        default_latency = sum(known) / len(known) if known else 1.0
+        #
+        def _score(idx):
+            state = states[idx]
+            latency = state.latency if state.latency is not None else default_latency
+            return (state.outstanding + 1) * latency / max(endpoints[idx].weight, 1e-9)
+        #
+        return min(range(len(endpoints)), key=_score)
+
+
+endpoint_balancer = EndpointBalancer()
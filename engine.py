@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Asyncio execution engine """
+
+import asyncio
+import contextlib
+import threading
+from concurrent.futures import Future
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+
+class AsyncEngine:  # pylint: disable=R0902
+    """
+        Runs upstream calls on a dedicated event loop thread
+
+        Callers submit coroutine factories and get concurrent futures back, so many
+        requests can be in flight while waiting on Azure without holding a thread each.
+        Semaphores per (endpoint api_base, deployment) cap in-flight upstream calls, so
+        endpoint pools scale concurrency with their endpoint count
+
+        Limitation: pylon RPCs (predict, chat_completion, completion) wait on the future
+        with .result(), so each RPC still blocks its calling thread for the whole upstream
+        call. There the engine adds a thread hop, not concurrency. Only in-process callers
+        that keep the futures of utils.submit_* (and do not block on them right away)
+        get more requests in flight than they have threads
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.max_in_flight_per_deployment = 64
+        #
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._semaphores = {}
+        self._on_stop = []
+        #
+        self.in_flight = {}
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def configure(self, config: dict):
+        """
+            Apply engine config: enabled, max_in_flight_per_deployment (per endpoint api_base)
+
+            RPC callers still block a thread per request while enabled, see class docstring
+        """
+        self.enabled = config.get("enabled", self.enabled)
+        self.max_in_flight_per_deployment = config.get(
+            "max_in_flight_per_deployment", self.max_in_flight_per_deployment
+        )
+
+    def on_stop(self, coroutine_function):
+        """ Register cleanup coroutine to run on loop before it stops (once per function) """
+        if coroutine_function not in self._on_stop:
+            self._on_stop.append(coroutine_function)
+
+    def call_soon(self, coroutine_function) -> bool:
+        """ Run coroutine_function() on running loop without waiting, False when not running """
+        with self._lock:
+            loop = self._loop
+        if loop is None:
+            return False
+        #
+        def _log_failure(future):
+            if not future.cancelled() and future.exception() is not None:
+                log.error("Async engine background call failed: %s", future.exception())
+        #
+        try:
+            asyncio.run_coroutine_threadsafe(coroutine_function(), loop).add_done_callback(_log_failure)
+        except RuntimeError:  # loop closed concurrently
+            return False
+        return True
+
+    def submit(self, coroutine_function) -> Future:
+        """ Run coroutine_function() on engine loop """
+        loop = self._ensure_loop()
+        with self._lock:
+            self.submitted += 1
+        return asyncio.run_coroutine_threadsafe(self._run(coroutine_function), loop)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, api_base, deployment):
+        """ Hold one of max_in_flight_per_deployment slots of endpoint deployment (on engine loop) """
+        key = (api_base, deployment)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            # Only touched from loop thread
+            semaphore = asyncio.Semaphore(self.max_in_flight_per_deployment)
+            self._semaphores[key] = semaphore
+        #
+        async with semaphore:
+            with self._lock:
+                self.in_flight[key] = self.in_flight.get(key, 0) + 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self.in_flight[key] -= 1
+
+    def stop(self):
+        """ Stop loop thread """
+        with self._lock:
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+            self._semaphores = {}
+        #
+        if loop is None:
+            return
+        #
+        try:
+            asyncio.run_coroutine_threadsafe(self._cleanup(), loop).result(timeout=10)
+        except:  # pylint: disable=W0702
+            log.exception("Async engine cleanup failed")
+        #
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=10)
+
+    def stats(self) -> dict:
+        """ Get engine counters """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "running": self._loop is not None,
+                "in_flight": {"/".join(key): value for key, value in self.in_flight.items() if value},
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    async def _run(self, coroutine_function):
+        try:
+            result = await coroutine_function()
+        except:
+            with self._lock:
+                self.failed += 1
+            raise
+        with self._lock:
+            self.completed += 1
+        return result
+
+    async def _cleanup(self):
+        for coroutine_function in self._on_stop:
+            try:
+                await coroutine_function()
+            except:  # pylint: disable=W0702
+                log.exception("Async engine cleanup hook failed")
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=self._loop_main, args=(loop,),
+                    name="open_ai_azure_engine", daemon=True,
+                )
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    @staticmethod
+    def _loop_main(loop):
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+
+async_engine = AsyncEngine()
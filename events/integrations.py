@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Event """
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401,W0611
+from pylon.core.tools import web  # pylint: disable=E0611,E0401,W0611
+
+from ..profiles import invalidate as invalidate_profiles
+
+
+class Event:  # pylint: disable=E1101,R0903,W0201
+    """
+        Event Resource
+
+        self is pointing to current Module instance
+
+        web.event decorator takes one argument: event name
+        Note: web.event decorator must be the last decorator (at top)
+    """
+
+    integration_name = 'open_ai_azure'
+
+    @web.event(f'{integration_name}_created_or_updated')
+    def integration_created_or_updated(self, context, event, payload):  # pylint: disable=W0613
+        """ Drop profiles of saved integration """
+        integration_id = payload.get("id") if isinstance(payload, dict) else None
+        invalidate_profiles(integration_id)
@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Hedged requests """
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+
+def _percentile(values, percentile):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(percentile * len(ordered)), len(ordered) - 1)]
+
+
+def _consume(task):
+    """ Retrieve result of abandoned task, so its errors are not logged as never retrieved """
+    if not task.cancelled():
+        task.exception()
+
+
+class _Samples:  # pylint: disable=R0903
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)
+        self.delay = None
+        self.added = 0
+
+
+class HedgingPolicy:  # pylint: disable=R0902
+    """
+        Hedged upstream calls of the async engine
+
+        When an attempt has not returned response (headers, i.e. first chunk for streams)
+        within the live latency percentile of its deployment, a duplicate is sent to another
+        endpoint of the pool; first answer wins, the loser is cancelled. Hedges are limited
+        to budget (share of requests) and start after min_samples latencies are known.
+        Blocking (sync) calls cannot be cancelled and are never hedged
+    """
+
+    def __init__(  # pylint: disable=R0913
+            self, enabled=False, deployments=None, percentile=0.9, min_delay=0.05,
+            max_delay=None, min_samples=20, window=500, budget=0.05, same_endpoint=False,
+    ):
+        self.enabled = enabled
+        self.deployments = deployments  # None: all deployments
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.budget = budget
+        self.same_endpoint = same_endpoint
+        #
+        self._lock = threading.Lock()
+        self._samples = {}  # deployment -> _Samples
+        self._credit = 0.0
+        self._outcomes = deque(maxlen=1000)  # (latency, estimated latency without hedging)
+        #
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+        self.no_alternative = 0
+
+    def configure(self, config: dict):
+        """ Apply hedging config, resets latency samples """
+        with self._lock:
+            for key in [
+                    "enabled", "deployments", "percentile", "min_delay", "max_delay",
+                    "min_samples", "window", "budget", "same_endpoint",
+            ]:
+                if key in config:
+                    setattr(self, key, config[key])
+            self._samples.clear()
+            self._credit = 0.0
+
+    def applies(self, deployment) -> bool:
+        """ Check if calls to deployment go through run() """
+        return self.enabled and (self.deployments is None or deployment in self.deployments)
+
+    def delay(self, deployment):
+        """ Get seconds to wait before hedging, None while not enough latencies are known """
+        with self._lock:
+            samples = self._samples.get(deployment)
+            return None if samples is None else samples.delay
+
+    async def run(self, deployment, primary, hedge):
+        """
+            Await primary coroutine, hedged with hedge() coroutine when it is slow
+
+            hedge is called only when hedging, returns None when there is no endpoint to hedge to
+        """
+        start = time.perf_counter()
+        tasks = [asyncio.ensure_future(primary)]
+        with self._lock:
+            self.requests += 1
+            self._credit = min(self._credit + self.budget, max(self.budget * 100, 1.0))
+        #
+        try:
+            delay = self.delay(deployment)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self._has_credit():
+                    # resolve alternative first, budget is spent on sent hedges only
+                    second = hedge()
+                    if second is not None:
+                        self._spend_credit()
+                        tasks.append(asyncio.ensure_future(second))
+                        return await self._race(deployment, start, *tasks)
+                    with self._lock:
+                        self.no_alternative += 1
+            #
+            result = await tasks[0]
+        finally:
+            for task in tasks:
+                if task.done():
+                    _consume(task)
+                else:
+                    task.add_done_callback(_consume)
+                    task.cancel()
+        #
+        latency = time.perf_counter() - start
+        self._observe(deployment, latency, latency, latency)
+        return result
+
+    def stats(self) -> dict:
+        """ Get hedging counters and latency percentiles with / without hedging """
+        with self._lock:
+            outcomes = list(self._outcomes)
+            result = {
+                "enabled": self.enabled,
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "budget_denied": self.budget_denied,
+                "no_alternative": self.no_alternative,
+                "delays": {
+                    deployment: samples.delay for deployment, samples in self._samples.items()
+                },
+            }
+        #
+        latencies = [item[0] for item in outcomes]
+        unhedged = [item[1] for item in outcomes]
+        for name, percentile in [("p50", 0.5), ("p90", 0.9), ("p99", 0.99)]:
+            result[name] = _percentile(latencies, percentile)
+            # estimated, latencies of cancelled primaries are sampled from known ones
+            result[f"{name}_unhedged"] = _percentile(unhedged, percentile)
+        return result
+
+    def _has_credit(self) -> bool:
+        with self._lock:
+            if self._credit < 1.0:
+                self.budget_denied += 1
+                return False
+            return True
+
+    def _spend_credit(self):
+        with self._lock:
+            self._credit -= 1.0
+            self.hedged += 1
+
+    async def _race(self, deployment, start, first, second):
+        hedge_start = time.perf_counter()
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return self._finish(deployment, start, hedge_start, task is second, task)
+                if task is first or error is None:
+                    error = task.exception()
+        raise error
+
+    def _finish(self, deployment, start, hedge_start, hedge_won, task):
+        now = time.perf_counter()
+        latency = now - start
+        if not hedge_won:
+            self._observe(deployment, latency, latency, latency)
+            return task.result()
+        #
+        with self._lock:
+            self.hedge_wins += 1
+            # cancelled primary would have taken one of known latencies above its elapsed time
+            samples = self._samples.get(deployment)
+            slower = [item for item in samples.latencies if item > latency] if samples else []
+            unhedged = random.choice(slower) if slower else latency
+        self._observe(deployment, latency, unhedged, now - hedge_start)
+        return task.result()
+
+    def _observe(self, deployment, latency, unhedged, attempt_latency):
+        with self._lock:
+            self._outcomes.append((latency, unhedged))
+            #
+            samples = self._samples.get(deployment)
+            if samples is None:
+                samples = _Samples(self.window)
+                self._samples[deployment] = samples
+            samples.latencies.append(attempt_latency)
+            samples.added += 1
+            if len(samples.latencies) >= self.min_samples and (
+                    samples.delay is None or samples.added % 16 == 0
+            ):
+                delay = max(_percentile(samples.latencies, self.percentile), self.min_delay)
+                if self.max_delay is not None:
+                    delay = min(delay, self.max_delay)
+                samples.delay = delay
+
+
+hedging_policy = HedgingPolicy()
@@ -17,6 +17,7 @@
 
 """ Method """
 
+import hashlib
 import json
 
 from pylon.core.tools import log  # pylint: disable=E0611,E0401,W0611
@@ -24,6 +25,128 @@ from pylon.core.tools import web  # pylint: disable=E0611,E0401,W0611
 
 from tools import context, worker_client  # pylint: disable=E0611,E0401
 
+from ..breakers import circuit_breakers, CircuitOpen
+from ..clients import credential_fingerprint
+from ..embeddings import embedding_dimensions
+from ..endpoints import endpoint_pool, endpoint_balancer
+from ..payloads import normalize_payload
+from ..profiles import get_profile
+from ..retries import retry_policy
+from ..secrets_cache import secret_cache
+
+
+def _invocation_profile(module, settings):
+    """ Get cached invocation profile for worker_client settings object """
+    try:
+        integration_id = settings.integration.id
+    except AttributeError:
+        integration_id = None
+    #
+    return get_profile(
+        integration_id, settings.merged_settings,
+        settings.merged_settings["model_name"], module.override_ai_model_params,
+    )
+
+
+def _auth_kwargs(module, settings, reference=None):
+    """ Resolve per-call credentials for worker_client settings object """
+    if module.ad_token_provider is not None:
+        return {"azure_ad_token": module.ad_token_provider()}
+    #
+    try:
+        project_id = settings.integration.project_id
+    except AttributeError:
+        project_id = None
+    #
+    if reference is None:
+        reference = settings.merged_settings["api_token"]
+    api_token = secret_cache.resolve(
+        project_id, reference,
+        lambda: worker_client.unsecret_data(reference, project_id),
+    )
+    #
+    return {"api_key": api_token}
+
+
+def _pick_endpoint(settings: dict, model, check_circuit=True):
+    """ Pick endpoint of settings pool by weighted round-robin (no completion feedback here) """
+    endpoints = endpoint_pool(settings, model)
+    if check_circuit and circuit_breakers.enabled:
+        endpoints = [
+            endpoint for endpoint in endpoints
+            if circuit_breakers.available(endpoint.api_base, model)
+        ]
+        if not endpoints:
+            raise CircuitOpen(f"All endpoints of {model} have open circuits")
+    return endpoints[endpoint_balancer.choose(endpoints, model, strategy="weighted_round_robin")]
+
+
+def _connection_kwargs(module, settings, check_circuit=True):
+    """ Endpoint and credentials for worker_client settings object """
+    merged_settings = settings.merged_settings
+    endpoint = _pick_endpoint(merged_settings, merged_settings["model_name"], check_circuit)
+    if not merged_settings.get("endpoints"):
+        return _auth_kwargs(module, settings)
+    #
+    return {
+        "azure_endpoint": endpoint.api_base,
+        "api_version": endpoint.api_version,
+        **_auth_kwargs(module, settings, endpoint.api_token),
+    }
+
+
+CREDENTIAL_KWARGS = ("api_key", "azure_ad_token")
+
+
+def _routing_key(target_class, target_kwargs, client_attr=None):
+    """
+        Make stable routing / client cache key of Helper target
+
+        Same key means same client config (endpoint, api_version, credential, model and
+        parameters), so the worker can keep a warm client for it. Credentials enter the key
+        as fingerprints only
+    """
+    key_kwargs = {}
+    for name, value in target_kwargs.items():
+        if name in CREDENTIAL_KWARGS and value is not None:
+            if not isinstance(value, str):
+                value = json.dumps(value, sort_keys=True, default=str)
+            value = credential_fingerprint(value)
+        key_kwargs[name] = value
+    #
+    data = json.dumps(
+        [target_class, client_attr, key_kwargs], sort_keys=True, default=str,
+    )
+    return hashlib.sha256(data.encode()).hexdigest()[:32]
+
+
+def _helper_descriptor(  # pylint: disable=R0913
+        target_class, target_kwargs, method, method_kwargs, client_attr=None,
+    ):
+    """ Make worker descriptor for plugins.open_ai_azure_worker.utils.ai.Helper """
+    target_kwargs = {
+        **target_kwargs,
+        **retry_policy.descriptor_kwargs(),
+    }
+    #
+    return {
+        "routing_key": _routing_key(target_class, target_kwargs, client_attr),
+        #
+        "target": "plugins.open_ai_azure_worker.utils.ai.Helper",
+        "target_args": None,
+        "target_kwargs": {
+            "target_class": target_class,
+            "target_args": None,
+            "target_kwargs": target_kwargs,
+            "client_attr": client_attr,
+        },
+        "target_io_bound": True,
+        #
+        "method": method,
+        "method_args": None,
+        "method_kwargs": method_kwargs,
+    }
+
 
 class Method:  # pylint: disable=E1101,R0903,W0201
     """
@@ -44,7 +167,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
             self, settings,
         ):
         """ Check integration settings/test connection """
-        settings = json.loads(json.dumps(settings))
+        settings = normalize_payload(settings)
         #
         target_kwargs = {
             "azure_endpoint": settings["api_base"],
@@ -56,32 +179,20 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         else:
             target_kwargs["api_key"] = settings["api_token"]
         #
-        result = {
-            "routing_key": None,
-            #
-            "target": "plugins.open_ai_azure_worker.utils.ai.Helper",
-            "target_args": None,
-            "target_kwargs": {
-                "target_class": "langchain_openai.chat_models.azure.AzureChatOpenAI",
-                "target_args": None,
-                "target_kwargs": target_kwargs,
-                "client_attr": "client._client",
-            },
-            "target_io_bound": True,
-            #
-            "method": "check_settings",
-            "method_args": None,
-            "method_kwargs": None,
-        }
-        #
-        return result
+        return _helper_descriptor(
+            "langchain_openai.chat_models.azure.AzureChatOpenAI",
+            target_kwargs,
+            "check_settings",
+            None,
+            client_attr="client._client",
+        )
 
     @web.method()
     def ai_get_models(  # pylint: disable=R0913
             self, settings,
         ):
         """ Get model list """
-        settings = json.loads(json.dumps(settings))
+        settings = normalize_payload(settings)
         #
         target_kwargs = {
             "azure_endpoint": settings["api_base"],
@@ -93,99 +204,37 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         else:
             target_kwargs["api_key"] = settings["api_token"]
         #
-        result = {
-            "routing_key": None,
-            #
-            "target": "plugins.open_ai_azure_worker.utils.ai.Helper",
-            "target_args": None,
-            "target_kwargs": {
-                "target_class": "langchain_openai.chat_models.azure.AzureChatOpenAI",
-                "target_args": None,
-                "target_kwargs": target_kwargs,
-                "client_attr": "client._client",
-            },
-            "target_io_bound": True,
-            #
-            "method": "get_models",
-            "method_args": None,
-            "method_kwargs": None,
-        }
-        #
-        return result
+        return _helper_descriptor(
+            "langchain_openai.chat_models.azure.AzureChatOpenAI",
+            target_kwargs,
+            "get_models",
+            None,
+            client_attr="client._client",
+        )
 
     @web.method()
     def count_tokens(  # pylint: disable=R0913
             self, settings, data,
         ):
         """ Count input/output/data tokens """
-        #
-        model = settings.merged_settings["model_name"]
-        model_parameters = {}
-        #
-        for param in ["max_tokens", "temperature", "top_p"]:
-            if param in settings.merged_settings:
-                model_parameters[param] = settings.merged_settings[param]
-        #
-        model_parameters = self.override_ai_model_params(model, model_parameters)
-        #
-        target_kwargs = {
-            "model": model,
-            #
-            **model_parameters,
-            #
-            "azure_endpoint": settings.merged_settings["api_base"],
-            "api_version": settings.merged_settings["api_version"],
-        }
-        #
         module = context.module_manager.module.open_ai_azure
-        if module.ad_token_provider is None:
-            try:
-                project_id = settings.integration.project_id
-            except AttributeError:
-                project_id = None
-            #
-            api_token = worker_client.unsecret_data(
-                settings.merged_settings["api_token"], project_id
-            )
-            #
-            target_kwargs["api_key"] = api_token
-        else:
-            target_kwargs["azure_ad_token"] = module.ad_token_provider()
+        profile = _invocation_profile(module, settings)
         #
         if isinstance(data, list):
-            data = json.loads(json.dumps(data))
-        #
-        model_is_legacy_completion = False
-        for model_data in settings.merged_settings["models"]:
-            if model_data["name"] == settings.merged_settings["model_name"]:
-                if not model_data["capabilities"]["chat_completion"]:
-                    model_is_legacy_completion = True
+            data = normalize_payload(data)
         #
         target_class = "langchain_openai.chat_models.azure.AzureChatOpenAI"
-        if model_is_legacy_completion:
+        if not profile.chat_completion:
             target_class = "langchain_openai.llms.azure.AzureOpenAI"
         #
-        result = {
-            "routing_key": None,
-            #
-            "target": "plugins.open_ai_azure_worker.utils.ai.Helper",
-            "target_args": None,
-            "target_kwargs": {
-                "target_class": target_class,
-                "target_args": None,
-                "target_kwargs": target_kwargs,
-                "client_attr": None,
-            },
-            "target_io_bound": True,
-            #
-            "method": "count_tokens",
-            "method_args": None,
-            "method_kwargs": {
+        return _helper_descriptor(
+            target_class,
+            profile.target_kwargs(**_connection_kwargs(module, settings, check_circuit=False)),
+            "count_tokens",
+            {
                 "data": data,
             },
-        }
-        #
-        return result
+        )
 
     #
     # LLM
@@ -196,125 +245,38 @@ class Method:  # pylint: disable=E1101,R0903,W0201
             self, settings, text,
         ):
         """ Call model """
-        #
-        model = settings.merged_settings["model_name"]
-        model_parameters = {}
-        #
-        for param in ["max_tokens", "temperature", "top_p"]:
-            if param in settings.merged_settings:
-                model_parameters[param] = settings.merged_settings[param]
-        #
-        model_parameters = self.override_ai_model_params(model, model_parameters)
-        #
-        target_kwargs = {
-            "model": model,
-            #
-            **model_parameters,
-            #
-            "azure_endpoint": settings.merged_settings["api_base"],
-            "api_version": settings.merged_settings["api_version"],
-        }
-        #
         module = context.module_manager.module.open_ai_azure
-        if module.ad_token_provider is None:
-            try:
-                project_id = settings.integration.project_id
-            except AttributeError:
-                project_id = None
-            #
-            api_token = worker_client.unsecret_data(
-                settings.merged_settings["api_token"], project_id
-            )
-            #
-            target_kwargs["api_key"] = api_token
-        else:
-            target_kwargs["azure_ad_token"] = module.ad_token_provider()
+        profile = _invocation_profile(module, settings)
         #
-        result = {
-            "routing_key": None,
-            #
-            "target": "plugins.open_ai_azure_worker.utils.ai.Helper",
-            "target_args": None,
-            "target_kwargs": {
-                "target_class": "langchain_openai.llms.azure.AzureOpenAI",
-                "target_args": None,
-                "target_kwargs": target_kwargs,
-                "client_attr": None,
-            },
-            "target_io_bound": True,
-            #
-            "method": "llm_invoke",
-            "method_args": None,
-            "method_kwargs": {
+        return _helper_descriptor(
+            "langchain_openai.llms.azure.AzureOpenAI",
+            profile.target_kwargs(**_connection_kwargs(module, settings)),
+            "llm_invoke",
+            {
                 "text": text,
             },
-        }
-        #
-        return result
+        )
 
     @web.method()
     def llm_stream(  # pylint: disable=R0913
             self, settings, text, stream_id,
         ):
         """ Stream model """
-        #
-        model = settings.merged_settings["model_name"]
-        model_parameters = {}
-        #
-        for param in ["max_tokens", "temperature", "top_p"]:
-            if param in settings.merged_settings:
-                model_parameters[param] = settings.merged_settings[param]
-        #
-        model_parameters = self.override_ai_model_params(model, model_parameters)
-        #
-        target_kwargs = {
-            "model": model,
-            #
-            **model_parameters,
-            #
-            "azure_endpoint": settings.merged_settings["api_base"],
-            "api_version": settings.merged_settings["api_version"],
-            #
-            "streaming": True,
-        }
-        #
         module = context.module_manager.module.open_ai_azure
-        if module.ad_token_provider is None:
-            try:
-                project_id = settings.integration.project_id
-            except AttributeError:
-                project_id = None
-            #
-            api_token = worker_client.unsecret_data(
-                settings.merged_settings["api_token"], project_id
-            )
-            #
-            target_kwargs["api_key"] = api_token
-        else:
-            target_kwargs["azure_ad_token"] = module.ad_token_provider()
-        #
-        result = {
-            "routing_key": None,
-            #
-            "target": "plugins.open_ai_azure_worker.utils.ai.Helper",
-            "target_args": None,
-            "target_kwargs": {
-                "target_class": "langchain_openai.llms.azure.AzureOpenAI",
-                "target_args": None,
-                "target_kwargs": target_kwargs,
-                "client_attr": None,
-            },
-            "target_io_bound": True,
-            #
-            "method": "llm_stream",
-            "method_args": None,
-            "method_kwargs": {
+        profile = _invocation_profile(module, settings)
+        #
+        return _helper_descriptor(
+            "langchain_openai.llms.azure.AzureOpenAI",
+            profile.target_kwargs(
+                streaming=True,
+                **_connection_kwargs(module, settings),
+            ),
+            "llm_stream",
+            {
                 "text": text,
                 "stream_id": stream_id,
             },
-        }
-        #
-        return result
+        )
 
     #
     # ChatModel
@@ -325,125 +287,38 @@ class Method:  # pylint: disable=E1101,R0903,W0201
             self, settings, messages,
         ):
         """ Call model """
-        #
-        model = settings.merged_settings["model_name"]
-        model_parameters = {}
-        #
-        for param in ["max_tokens", "temperature", "top_p"]:
-            if param in settings.merged_settings:
-                model_parameters[param] = settings.merged_settings[param]
-        #
-        model_parameters = self.override_ai_model_params(model, model_parameters)
-        #
-        target_kwargs = {
-            "model": model,
-            #
-            **model_parameters,
-            #
-            "azure_endpoint": settings.merged_settings["api_base"],
-            "api_version": settings.merged_settings["api_version"],
-        }
-        #
         module = context.module_manager.module.open_ai_azure
-        if module.ad_token_provider is None:
-            try:
-                project_id = settings.integration.project_id
-            except AttributeError:
-                project_id = None
-            #
-            api_token = worker_client.unsecret_data(
-                settings.merged_settings["api_token"], project_id
-            )
-            #
-            target_kwargs["api_key"] = api_token
-        else:
-            target_kwargs["azure_ad_token"] = module.ad_token_provider()
-        #
-        result = {
-            "routing_key": None,
-            #
-            "target": "plugins.open_ai_azure_worker.utils.ai.Helper",
-            "target_args": None,
-            "target_kwargs": {
-                "target_class": "langchain_openai.chat_models.azure.AzureChatOpenAI",
-                "target_args": None,
-                "target_kwargs": target_kwargs,
-                "client_attr": None,
-            },
-            "target_io_bound": True,
-            #
-            "method": "chat_invoke",
-            "method_args": None,
-            "method_kwargs": {
-                "messages": json.loads(json.dumps(messages)),
+        profile = _invocation_profile(module, settings)
+        #
+        return _helper_descriptor(
+            "langchain_openai.chat_models.azure.AzureChatOpenAI",
+            profile.target_kwargs(**_connection_kwargs(module, settings)),
+            "chat_invoke",
+            {
+                "messages": normalize_payload(messages),
             },
-        }
-        #
-        return result
+        )
 
     @web.method()
     def chat_model_stream(  # pylint: disable=R0913
             self, settings, messages, stream_id,
         ):
         """ Stream model """
-        #
-        model = settings.merged_settings["model_name"]
-        model_parameters = {}
-        #
-        for param in ["max_tokens", "temperature", "top_p"]:
-            if param in settings.merged_settings:
-                model_parameters[param] = settings.merged_settings[param]
-        #
-        model_parameters = self.override_ai_model_params(model, model_parameters)
-        #
-        target_kwargs = {
-            "model": model,
-            #
-            **model_parameters,
-            #
-            "azure_endpoint": settings.merged_settings["api_base"],
-            "api_version": settings.merged_settings["api_version"],
-            #
-            "streaming": True,
-        }
-        #
         module = context.module_manager.module.open_ai_azure
-        if module.ad_token_provider is None:
-            try:
-                project_id = settings.integration.project_id
-            except AttributeError:
-                project_id = None
-            #
-            api_token = worker_client.unsecret_data(
-                settings.merged_settings["api_token"], project_id
-            )
-            #
-            target_kwargs["api_key"] = api_token
-        else:
-            target_kwargs["azure_ad_token"] = module.ad_token_provider()
-        #
-        result = {
-            "routing_key": None,
-            #
-            "target": "plugins.open_ai_azure_worker.utils.ai.Helper",
-            "target_args": None,
-            "target_kwargs": {
-                "target_class": "langchain_openai.chat_models.azure.AzureChatOpenAI",
-                "target_args": None,
-                "target_kwargs": target_kwargs,
-                "client_attr": None,
-            },
-            "target_io_bound": True,
-            #
-            "method": "chat_stream",
-            "method_args": None,
-            "method_kwargs": {
-                "messages": json.loads(json.dumps(messages)),
+        profile = _invocation_profile(module, settings)
+        #
+        return _helper_descriptor(
+            "langchain_openai.chat_models.azure.AzureChatOpenAI",
+            profile.target_kwargs(
+                streaming=True,
+                **_connection_kwargs(module, settings),
+            ),
+            "chat_stream",
+            {
+                "messages": normalize_payload(messages),
                 "stream_id": stream_id,
             },
-        }
-        #
-        return result
+        )
 
     #
     # Embed
@@ -461,33 +336,29 @@ class Method:  # pylint: disable=E1101,R0903,W0201
             "api_version": settings["integration_data"]["settings"]["api_version"],
         }
         #
+        dimensions = embedding_dimensions(settings)
+        if dimensions is not None:
+            target_kwargs["dimensions"] = dimensions
+        #
+        batcher_config = self.descriptor.config.get("embedding_batcher", {})
+        if "max_inputs" in batcher_config:
+            # AzureOpenAIEmbeddings splits texts into requests of chunk_size inputs
+            target_kwargs["chunk_size"] = batcher_config["max_inputs"]
+        #
         module = context.module_manager.module.open_ai_azure
         if module.ad_token_provider is None:
             target_kwargs["api_key"] = settings["integration_data"]["settings"]["api_token"]
         else:
             target_kwargs["azure_ad_token"] = module.ad_token_provider()
         #
-        result = {
-            "routing_key": None,
-            #
-            "target": "plugins.open_ai_azure_worker.utils.ai.Helper",
-            "target_args": None,
-            "target_kwargs": {
-                "target_class": "langchain_openai.embeddings.azure.AzureOpenAIEmbeddings",
-                "target_args": None,
-                "target_kwargs": target_kwargs,
-                "client_attr": None,
-            },
-            "target_io_bound": True,
-            #
-            "method": "embed_documents",
-            "method_args": None,
-            "method_kwargs": {
+        return _helper_descriptor(
+            "langchain_openai.embeddings.azure.AzureOpenAIEmbeddings",
+            target_kwargs,
+            "embed_documents",
+            {
                 "texts": texts,
             },
-        }
-        #
-        return result
+        )
 
     @web.method()
     def embed_query(  # pylint: disable=R0913
@@ -501,33 +372,24 @@ class Method:  # pylint: disable=E1101,R0903,W0201
             "api_version": settings["integration_data"]["settings"]["api_version"],
         }
         #
+        dimensions = embedding_dimensions(settings)
+        if dimensions is not None:
+            target_kwargs["dimensions"] = dimensions
+        #
         module = context.module_manager.module.open_ai_azure
         if module.ad_token_provider is None:
             target_kwargs["api_key"] = settings["integration_data"]["settings"]["api_token"]
         else:
             target_kwargs["azure_ad_token"] = module.ad_token_provider()
         #
-        result = {
-            "routing_key": None,
-            #
-            "target": "plugins.open_ai_azure_worker.utils.ai.Helper",
-            "target_args": None,
-            "target_kwargs": {
-                "target_class": "langchain_openai.embeddings.azure.AzureOpenAIEmbeddings",
-                "target_args": None,
-                "target_kwargs": target_kwargs,
-                "client_attr": None,
-            },
-            "target_io_bound": True,
-            #
-            "method": "embed_query",
-            "method_args": None,
-            "method_kwargs": {
+        return _helper_descriptor(
+            "langchain_openai.embeddings.azure.AzureOpenAIEmbeddings",
+            target_kwargs,
+            "embed_query",
+            {
                 "text": text,
             },
-        }
-        #
-        return result
+        )
 
     #
     # Indexer
@@ -538,20 +400,17 @@ class Method:  # pylint: disable=E1101,R0903,W0201
             self, settings, model,
         ):
         """ Make indexer config """
+        profile = get_profile(
+            settings.get("id"), settings["settings"], model, self.override_ai_model_params,
+        )
         #
-        model_info = None
-        #
-        for item in settings["settings"]["models"]:
-            if item["name"] == model:
-                model_info = item
-                break
-        #
-        if model_info is None:
+        if profile.model_info is None:
             raise RuntimeError(f"No model info found: {model}")
         #
+        endpoint = _pick_endpoint(settings["settings"], model)
         auth_kwargs = {
-            "azure_endpoint": settings["settings"]["api_base"],
-            "api_version": settings["settings"]["api_version"],
+            "azure_endpoint": endpoint.api_base,
+            "api_version": endpoint.api_version,
         }
         #
         indexer_use_ad_token_provider = self.descriptor.config.get(
@@ -567,8 +426,10 @@ class Method:  # pylint: disable=E1101,R0903,W0201
             except (AttributeError, KeyError):
                 project_id = None
             #
-            api_token = worker_client.unsecret_data(
-                settings["settings"]["api_token"], project_id
+            reference = endpoint.api_token
+            api_token = secret_cache.resolve(
+                project_id, reference,
+                lambda: worker_client.unsecret_data(reference, project_id),
             )
             #
             auth_kwargs["api_key"] = api_token
@@ -577,32 +438,31 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         else:
             auth_kwargs["azure_ad_token"] = module.ad_token_provider()
         #
-        if model_info["capabilities"]["embeddings"]:
+        if profile.model_info["capabilities"]["embeddings"]:
+            dimensions_kwargs = {}
+            if settings["settings"].get("embedding_dimensions") is not None:
+                dimensions_kwargs["dimensions"] = settings["settings"]["embedding_dimensions"]
+            #
             return {
                 "embedding_model": "langchain_openai.embeddings.azure.AzureOpenAIEmbeddings",
                 "embedding_model_params": {
                     "model": model,
                     #
                     **auth_kwargs,
+                    **dimensions_kwargs,
+                    **retry_policy.descriptor_kwargs(),
                 },
             }
         #
-        model_parameters = {}
-        #
-        for param in ["max_tokens", "temperature", "top_p"]:
-            if param in settings["settings"]:
-                model_parameters[param] = settings["settings"][param]
-        #
-        model_parameters = self.override_ai_model_params(model, model_parameters)
-        #
-        if not model_info["capabilities"]["chat_completion"]:
+        if not profile.chat_completion:
             return {
                 "ai_model": "langchain_openai.llms.azure.AzureOpenAI",
                 "ai_model_params": {
                     "model": model,
                     #
-                    **model_parameters,
+                    **profile.model_parameters,
                     **auth_kwargs,
+                    **retry_policy.descriptor_kwargs(),
                 },
             }
         #
@@ -611,7 +471,8 @@ class Method:  # pylint: disable=E1101,R0903,W0201
             "ai_model_params": {
                 "model": model,
                 #
-                **model_parameters,
+                **profile.model_parameters,
                 **auth_kwargs,
+                **retry_policy.descriptor_kwargs(),
             },
         }
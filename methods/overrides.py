@@ -20,6 +20,8 @@
 from pylon.core.tools import log  # pylint: disable=E0611,E0401,W0611
 from pylon.core.tools import web  # pylint: disable=E0611,E0401,W0611
 
+from ..model_registry import override_rules
+
 
 class Method:  # pylint: disable=E1101,R0903,W0201
     """
@@ -42,7 +44,7 @@ class Method:  # pylint: disable=E1101,R0903,W0201
         """ Apply required changes """
         result = parameters.copy()
         #
-        if model in self.descriptor.config.get("apply_o1_overrides_for", []):
+        if override_rules.matches(model):
             remap_keys = {
                 "max_tokens": "max_completion_tokens",
             }
@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Deployment model catalog cache """
+
+import copy
+import threading
+import time
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from .clients import credential_fingerprint
+
+
+def catalog_key(api_base, api_version, api_token=None) -> tuple:
+    """ Make catalog key, credential is only kept as fingerprint ("ad" for AD auth) """
+    return api_base, api_version, credential_fingerprint(api_token)
+
+
+class ModelCatalog:  # pylint: disable=R0902
+    """
+        Cache of raw model lists returned by worker ai_get_models
+
+        Fresh entries (younger than ttl) are served from memory. Stale entries (up to
+        ttl + stale_ttl) are served too while one background refresh runs. Older entries
+        and force=True fetch synchronously, with a single fetch in flight per key
+    """
+
+    def __init__(self, enabled=True, ttl=300, stale_ttl=3600):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        #
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (fetched_at, models)
+        self._key_locks = {}  # key -> lock held while fetching
+        self._refreshing = set()
+        #
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.forced = 0
+        self.background_refreshes = 0
+        self.failures = 0
+
+    def configure(self, config: dict):
+        """ Apply cache config """
+        self.enabled = config.get("enabled", self.enabled)
+        self.ttl = config.get("ttl", self.ttl)
+        self.stale_ttl = config.get("stale_ttl", self.stale_ttl)
+        #
+        if not self.enabled:
+            self.invalidate()
+
+    def get(self, key: tuple, loader, force=False) -> list:
+        """ Get model list for key, calling loader() when it has to be fetched """
+        if not self.enabled:
+            return loader()
+        #
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if force:
+                self.forced += 1
+            elif entry is not None and now - entry[0] < self.ttl:
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            elif entry is not None and now - entry[0] < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    threading.Thread(
+                        target=self._refresh, args=(key, loader),
+                        name="open_ai_azure_model_catalog", daemon=True,
+                    ).start()
+                return copy.deepcopy(entry[1])
+            else:
+                self.misses += 1
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        #
+        with key_lock:
+            if not force:
+                with self._lock:
+                    current = self._entries.get(key)
+                    if current is not None and current is not entry:
+                        return copy.deepcopy(current[1])  # fetched by concurrent caller
+            return copy.deepcopy(self._load(key, loader))
+
+    def invalidate(self, key=None):
+        """ Drop one entry or all of them """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        """ Get cache counters """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "ages": [now - entry[0] for entry in self._entries.values()],
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "forced": self.forced,
+                "background_refreshes": self.background_refreshes,
+                "failures": self.failures,
+            }
+
+    def _load(self, key, loader) -> list:
+        fetched_at = time.monotonic()
+        try:
+            models = loader()
+        except:  # pylint: disable=W0702
+            with self._lock:
+                self.failures += 1
+            raise
+        #
+        with self._lock:
+            self._entries[key] = (fetched_at, models)
+        return models
+
+    def _refresh(self, key, loader):
+        try:
+            with self._lock:
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+            with key_lock:
+                self._load(key, loader)
+            with self._lock:
+                self.background_refreshes += 1
+        except:  # pylint: disable=W0702
+            log.exception("Failed to refresh model catalog, keeping stale entry")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+
+model_catalog = ModelCatalog()
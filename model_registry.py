@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Model registry """
+
+import re
+import fnmatch
+
+
+DEFAULT_TOKEN_LIMIT = 8096
+
+
+class OverrideRules:
+    """
+        Model matcher for parameter override config (apply_o1_overrides_for)
+
+        Entries are exact model names or fnmatch globs, e.g. "o1*", "o3-mini-*"
+    """
+
+    def __init__(self, patterns=()):
+        self.configure(patterns)
+
+    def configure(self, patterns):
+        """ Set patterns """
+        self.patterns = tuple(patterns)
+        self._exact = frozenset(
+            pattern for pattern in self.patterns if not _is_glob(pattern)
+        )
+        globs = [pattern for pattern in self.patterns if _is_glob(pattern)]
+        self._regex = re.compile(
+            "|".join(fnmatch.translate(pattern) for pattern in globs)
+        ) if globs else None
+        self._matches = {}  # model -> bool
+
+    def matches(self, model) -> bool:
+        """ Check if overrides apply to model """
+        result = self._matches.get(model)
+        if result is None:
+            result = model in self._exact or (
+                self._regex is not None and isinstance(model, str)
+                and self._regex.match(model) is not None
+            )
+            if len(self._matches) < 4096:
+                self._matches[model] = result
+        return result
+
+
+def _is_glob(pattern) -> bool:
+    return any(char in pattern for char in "*?[")
+
+
+override_rules = OverrideRules()
+
+
+class ModelRegistry:
+    """
+        Lookup of settings models by id / name, built once per settings object
+
+        First entry wins on duplicates, same as the linear scans it replaces
+    """
+
+    def __init__(self, models: list):
+        self.models = models
+        self.by_id = {}
+        self.by_name = {}
+        for model in models:
+            self.by_id.setdefault(model.id, model)
+            self.by_name.setdefault(model.name, model)
+
+    def get(self, model_id):
+        """ Get model by id, None if not listed """
+        return self.by_id.get(model_id)
+
+    def capabilities(self, model_id) -> dict:
+        """ Get capabilities of model, empty for models not listed """
+        model = self.by_id.get(model_id)
+        if model is None:
+            return {}
+        return model.capabilities.dict()
+
+    def token_limit(self, model_id, default=DEFAULT_TOKEN_LIMIT) -> int:
+        """ Get token limit of model """
+        model = self.by_id.get(model_id)
+        if model is None:
+            return default
+        return model.token_limit
+
+    @staticmethod
+    def overrides(model_id) -> bool:
+        """ Check if parameter overrides (o1-style) apply to model """
+        return override_rules.matches(model_id)
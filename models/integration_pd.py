@@ -1,19 +1,20 @@
-import json
 from typing import List, Optional
 
 try:
-    from pydantic.v1 import BaseModel, root_validator, validator
+    from pydantic.v1 import BaseModel, PrivateAttr, root_validator, validator
 except:  # pylint: disable=W0702
-    from pydantic import BaseModel, root_validator, validator
+    from pydantic import BaseModel, PrivateAttr, root_validator, validator
 
-from tools import session_project, rpc_tools, VaultClient, worker_client, this, context, SecretString
+from tools import session_project, rpc_tools, worker_client, this, context, SecretString
 from pylon.core.tools import log
 
+from ..endpoints import endpoint_pool
+from ..model_registry import ModelRegistry
+from ..token_limits import token_limits
+
 
 def get_token_limits():
-    vault_client = VaultClient()
-    secrets = vault_client.get_all_secrets()
-    return json.loads(secrets.get('open_ai_azure_token_limits', ''))
+    return token_limits.get_all()
 
 
 class CapabilitiesModel(BaseModel):
@@ -40,6 +41,14 @@ class AIModel(BaseModel):
         return token_limits.get(values.get('id'), 8096)
 
 
+class EndpointModel(BaseModel):
+    api_base: str
+    api_version: Optional[str]
+    api_token: Optional[SecretString | str]
+    weight: int = 1
+    deployments: Optional[List[str]]
+
+
 class IntegrationModel(BaseModel):
     api_token: SecretString | str
     model_name: str = 'gpt-35-turbo'
@@ -51,6 +60,11 @@ class IntegrationModel(BaseModel):
     max_tokens: int = 512
     top_p: float = 0.8
     stream: bool = False
+    embedding_dimensions: Optional[int] = None
+    endpoints: List[EndpointModel] = []
+
+    _model_registry: Optional[ModelRegistry] = PrivateAttr(default=None)
+    _endpoint_pools: dict = PrivateAttr(default_factory=dict)
 
     @root_validator(pre=True)
     def prepare_model_list(cls, values):
@@ -59,12 +73,33 @@ class IntegrationModel(BaseModel):
             values['models'] = [AIModel(id=model, name=model).dict(by_alias=True) for model in models]
         return values
 
+    @property
+    def model_registry(self) -> ModelRegistry:
+        registry = self._model_registry
+        if registry is None or registry.models is not self.models:
+            registry = ModelRegistry(self.models)
+            self._model_registry = registry
+        return registry
+
+    def endpoint_pool(self, deployment) -> list:
+        """ Get endpoints serving deployment, primary api_base first """
+        pool = self._endpoint_pools.get(deployment)
+        if pool is None:
+            pool = endpoint_pool({
+                "api_base": self.api_base,
+                "api_version": self.api_version,
+                "api_token": self.api_token,
+                "endpoints": [endpoint.dict() for endpoint in self.endpoints],
+            }, deployment)
+            self._endpoint_pools[deployment] = pool
+        return pool
+
     @property
     def token_limit(self):
-        return next((model.token_limit for model in self.models if model.id == self.model_name), 8096)
+        return self.model_registry.token_limit(self.model_name)
 
     def get_token_limit(self, model_name):
-        return next((model.token_limit for model in self.models if model.id == model_name), 8096)
+        return self.model_registry.token_limit(model_name)
 
     def check_connection(self, project_id=None):
         if not project_id:
@@ -83,12 +118,13 @@ class IntegrationModel(BaseModel):
             settings=settings,
         )
 
-    def refresh_models(self, project_id):
+    def refresh_models(self, project_id, force_refresh=False):
         integration_name = 'open_ai_azure'
         payload = {
             'name': integration_name,
             'settings': self.dict(),
-            'project_id': project_id
+            'project_id': project_id,
+            'force_refresh': force_refresh,
         }
         return getattr(rpc_tools.RpcMixin().rpc.call, f'{integration_name}_set_models')(payload)
 
@@ -20,11 +20,28 @@ import json
 from pylon.core.tools import log  # pylint: disable=E0611,E0401
 from pylon.core.tools import module  # pylint: disable=E0611,E0401
 
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider  # pylint: disable=E0401
+from azure.identity import DefaultAzureCredential  # pylint: disable=E0401
 
 from tools import VaultClient, worker_client  # pylint: disable=E0611,E0401
 
+from .ad_tokens import AdTokenManager
+from .breakers import circuit_breakers
+from .clients import client_pool, async_client_pool
+from .embeddings import embedding_cache, embedding_batcher, query_coalescer
+from .endpoints import endpoint_balancer
+from .engine import async_engine
+from .hedging import hedging_policy
+from .model_catalog import model_catalog
+from .model_registry import override_rules
+from .profiles import invalidate as invalidate_profiles
+from .rate_limits import rate_limiter
+from .response_cache import response_cache
+from .retries import retry_policy
+from .secrets_cache import secret_cache
+from .semantic_cache import semantic_cache
 from .models.integration_pd import IntegrationModel
+from .token_limits import token_limits, TOKEN_LIMITS_SECRET
+from .tokens import token_memo
 
 
 TOKEN_LIMITS = {
@@ -55,6 +72,7 @@ class Module(module.ModuleModel):
         self.descriptor = descriptor
         #
         self.ad_token_scope = None
+        self.ad_token_manager = None
         self.ad_token_provider = None
 
     def init(self):
@@ -74,11 +92,36 @@ class Module(module.ModuleModel):
             settings_model=IntegrationModel,
         )
         #
+        token_limits.ttl = self.descriptor.config.get("token_limits_ttl", 300)
+        token_memo.max_entries = self.descriptor.config.get("token_memo_max_entries", 50000)
+        retry_policy.configure(self.descriptor.config.get("retries", {}))
+        client_pool_config = self.descriptor.config.get("client_pool", {})
+        if retry_policy.enabled:
+            client_pool_config = {**client_pool_config, "max_retries": 0}
+        client_pool.configure(client_pool_config)
+        async_client_pool.configure(client_pool_config)
+        async_engine.configure(self.descriptor.config.get("async_engine", {}))
+        secret_cache.configure(self.descriptor.config.get("secret_cache", {}))
+        embedding_cache.configure(self.descriptor.config.get("embedding_cache", {}))
+        embedding_batcher.configure(self.descriptor.config.get("embedding_batcher", {}))
+        query_coalescer.configure(self.descriptor.config.get("embed_query_coalescer", {}))
+        response_cache.configure(self.descriptor.config.get("response_cache", {}))
+        semantic_cache.configure(self.descriptor.config.get("semantic_cache", {}))
+        model_catalog.configure(self.descriptor.config.get("model_catalog", {}))
+        override_rules.configure(self.descriptor.config.get("apply_o1_overrides_for", []))
+        invalidate_profiles()  # profiles hold parameters after overrides
+        rate_limiter.configure(self.descriptor.config.get("rate_limits", {}))
+        endpoint_balancer.configure(self.descriptor.config.get("endpoints", {}))
+        circuit_breakers.configure(self.descriptor.config.get("circuit_breakers", {}))
+        hedging_policy.configure(self.descriptor.config.get("hedging", {}))
+        async_engine.on_stop(async_client_pool.aclose)
+        #
         vault_client = VaultClient()
         secrets = vault_client.get_all_secrets()
-        if 'open_ai_azure_token_limits' not in secrets:
-            secrets['open_ai_azure_token_limits'] = json.dumps(TOKEN_LIMITS)
+        if TOKEN_LIMITS_SECRET not in secrets:
+            secrets[TOKEN_LIMITS_SECRET] = json.dumps(TOKEN_LIMITS)
             vault_client.set_secrets(secrets)
+            token_limits.invalidate()
         #
         # Managed identity AD token
         #
@@ -86,9 +129,11 @@ class Module(module.ModuleModel):
             log.info("Using managed identity / AD for token")
             #
             self.ad_token_scope = secrets["open_ai_azure_ad_token"]
-            self.ad_token_provider = get_bearer_token_provider(
-                DefaultAzureCredential(), self.ad_token_scope
+            self.ad_token_manager = AdTokenManager(
+                DefaultAzureCredential(),
+                refresh_margin=self.descriptor.config.get("ad_token_refresh_margin", 300),
             )
+            self.ad_token_provider = self.ad_token_manager.provider(self.ad_token_scope)
         #
         worker_client.register_integration(
             integration_name=self.descriptor.name,
@@ -113,4 +158,15 @@ class Module(module.ModuleModel):
         """ De-init module """
         log.info('De-initializing')
         #
+        async_engine.stop()
+        client_pool.close()
+        if self.ad_token_manager is not None:
+            self.ad_token_manager.stop()
+        secret_cache.invalidate()
+        embedding_cache.close()
+        embedding_batcher.close()
+        response_cache.clear()
+        semantic_cache.invalidate()
+        model_catalog.invalidate()
+        #
         self.descriptor.deinit_all()
@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Payload normalization """
+
+import json
+
+
+def _normalize_key(key):
+    if type(key) is str:  # pylint: disable=C0123
+        return key
+    if isinstance(key, str):
+        return str.__str__(key)
+    if key is True:
+        return "true"
+    if key is False:
+        return "false"
+    if key is None:
+        return "null"
+    if isinstance(key, int):
+        return repr(int(key))
+    if isinstance(key, float):
+        return json.dumps(float(key))
+    raise TypeError(f"keys must be str, int, float, bool or None, not {type(key).__name__}")
+
+
+def normalize_payload(value):
+    """
+        Single-pass equivalent of json.loads(json.dumps(value))
+
+        Containers are rebuilt as plain dicts/lists, str/int/float subclasses are
+        reduced to base types, and string contents (e.g. large attachments) are
+        shared instead of being serialized and parsed again
+    """
+    value_type = type(value)
+    #
+    if value_type is str or value_type is int or value_type is float \
+            or value_type is bool or value is None:
+        return value
+    #
+    if isinstance(value, dict):
+        return {
+            _normalize_key(key): normalize_payload(item)
+            for key, item in value.items()
+        }
+    #
+    if isinstance(value, (list, tuple)):
+        return [normalize_payload(item) for item in value]
+    #
+    if isinstance(value, str):
+        return str.__str__(value)
+    if isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return float(value)
+    #
+    raise TypeError(f"Object of type {value_type.__name__} is not JSON serializable")
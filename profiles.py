@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Invocation profiles """
+
+import copy
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+from .models.integration_pd import IntegrationModel
+
+
+MODEL_PARAMETERS = ["max_tokens", "temperature", "top_p"]
+
+
+def settings_fingerprint(settings: dict) -> str:
+    """ Make stable fingerprint (version) of settings """
+    payload = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class InvocationProfile(NamedTuple):
+    """ Immutable per-(integration, settings version, model) invocation data """
+    model: str
+    model_info: Optional[MappingProxyType]  # entry of settings models, None if not listed
+    model_parameters: MappingProxyType  # after override_ai_model_params
+    azure_endpoint: str
+    api_version: str
+
+    @property
+    def chat_completion(self) -> bool:
+        """ Model supports chat completion (unknown models are treated as chat) """
+        if self.model_info is None:
+            return True
+        return self.model_info["capabilities"]["chat_completion"]
+
+    def target_kwargs(self, **kwargs) -> dict:
+        """ Make fresh target kwargs for a call """
+        return {
+            "model": self.model,
+            #
+            **self.model_parameters,
+            #
+            "azure_endpoint": self.azure_endpoint,
+            "api_version": self.api_version,
+            #
+            **kwargs,
+        }
+
+
+def _model_entry(settings: dict, model: str):
+    for item in settings.get("models", []):
+        if item["name"] == model:
+            return item
+    return None
+
+
+def profile_key(integration_id, settings: dict, model: str) -> tuple:
+    """
+        Make key of everything a profile is compiled from, without scanning settings models
+
+        Model entries of saved integrations only change on save, which drops their profiles
+        (events/integrations.py), so they are keyed by id. Unsaved settings have no such
+        event and are keyed by fingerprint of whole settings
+    """
+    if integration_id is None:
+        return None, settings_fingerprint(settings), model
+    return (
+        integration_id,
+        model,
+        settings["api_base"],
+        settings["api_version"],
+        tuple((param, settings[param]) for param in MODEL_PARAMETERS if param in settings),
+    )
+
+
+def compile_profile(settings: dict, model: str, override_params) -> InvocationProfile:
+    """ Build profile from (merged) integration settings """
+    model_info = _model_entry(settings, model)
+    if model_info is not None:
+        model_info = MappingProxyType(copy.deepcopy(model_info))
+    #
+    model_parameters = {}
+    for param in MODEL_PARAMETERS:
+        if param in settings:
+            model_parameters[param] = settings[param]
+    #
+    return InvocationProfile(
+        model=model,
+        model_info=model_info,
+        model_parameters=MappingProxyType(override_params(model, model_parameters)),
+        azure_endpoint=settings["api_base"],
+        api_version=settings["api_version"],
+    )
+
+
+class ProfileCache:
+    """ Bounded LRU of compiled objects keyed by (integration id, settings key, ...) """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        #
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        #
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, factory):
+        """ Get cached item or compile it with factory() """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return item
+            self.misses += 1
+        #
+        item = factory()
+        #
+        with self._lock:
+            self._entries[key] = item
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        #
+        return item
+
+    def invalidate(self, integration_id=None):
+        """ Drop entries of one integration (or all) """
+        with self._lock:
+            if integration_id is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == integration_id]:
+                self._entries.pop(key)
+
+    def stats(self) -> dict:
+        """ Get cache counters """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+invocation_profiles = ProfileCache()
+parsed_settings = ProfileCache()
+
+
+def get_profile(integration_id, settings: dict, model: str, override_params) -> InvocationProfile:
+    """ Get cached invocation profile """
+    return invocation_profiles.get(
+        profile_key(integration_id, settings, model),
+        lambda: compile_profile(settings, model, override_params),
+    )
+
+
+def parse_settings(settings: dict) -> IntegrationModel:
+    """ Get cached IntegrationModel for settings dict (do not mutate result) """
+    if isinstance(settings, IntegrationModel):
+        return settings
+    key = (None, settings_fingerprint(settings))
+    return parsed_settings.get(key, lambda: IntegrationModel.parse_obj(settings))
+
+
+def invalidate(integration_id=None):
+    """ Invalidate profiles, e.g. when integration is saved """
+    invocation_profiles.invalidate(integration_id)
+    if integration_id is None:
+        parsed_settings.invalidate()
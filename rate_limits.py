@@ -0,0 +1,265 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Client-side TPM / RPM limiter """
+
+import asyncio
+import threading
+import time
+from typing import NamedTuple
+
+
+class RateLimitTimeout(RuntimeError):
+    """ Request would have to wait past its deadline """
+
+
+class Reservation(NamedTuple):
+    """ Capacity taken by one request """
+    key: tuple
+    tokens: int
+
+
+def _header_int(headers, name):
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+
+def retry_after_seconds(headers):
+    """ Get server requested delay from retry-after-ms / retry-after headers """
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return None
+
+
+class _Bucket:  # pylint: disable=R0903
+    """ Token and request buckets of one deployment, refilled continuously per minute """
+
+    def __init__(self, tpm, rpm, now):
+        self.tpm = tpm
+        self.rpm = rpm
+        self.tokens = float(tpm) if tpm else 0.0
+        self.requests = float(rpm) if rpm else 0.0
+        self.blocked_until = 0.0
+        self.updated_at = now
+
+    def refill(self, now):
+        """ Add capacity for elapsed time """
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        if self.tpm:
+            self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+        if self.rpm:
+            self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+
+    def wait_time(self, tokens, now) -> float:
+        """ Get seconds until request fits, 0 when it fits now """
+        wait = max(self.blocked_until - now, 0.0)
+        if self.tpm:
+            # requests larger than the whole bucket only wait for a full bucket
+            needed = min(tokens, self.tpm)
+            if self.tokens < needed:
+                wait = max(wait, (needed - self.tokens) * 60 / self.tpm)
+        if self.rpm and self.requests < 1:
+            wait = max(wait, (1 - self.requests) * 60 / self.rpm)
+        return wait
+
+
+class RateLimiter:  # pylint: disable=R0902
+    """
+        Token bucket limiter per (api_base, deployment)
+
+        Requests are charged estimated prompt tokens + max_tokens up front and reconciled
+        with reported usage afterwards. Buckets are also clamped by x-ratelimit-remaining-*
+        headers and paused for retry-after on 429. Deployments without configured limits
+        are only paused by 429s
+    """
+
+    def __init__(self, enabled=False, tpm=None, rpm=None, deployments=None, max_wait=60):
+        self.enabled = enabled
+        self.tpm = tpm
+        self.rpm = rpm
+        self.deployments = deployments or {}
+        self.max_wait = max_wait
+        #
+        self._lock = threading.Lock()
+        self._buckets = {}
+        #
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.throttled = 0
+
+    def configure(self, config: dict):
+        """ Apply limiter config, e.g. {"enabled": true, "deployments": {"gpt-4o": {"tpm": 450000}}} """
+        with self._lock:
+            self.enabled = config.get("enabled", self.enabled)
+            self.tpm = config.get("tpm", self.tpm)
+            self.rpm = config.get("rpm", self.rpm)
+            self.deployments = config.get("deployments", self.deployments)
+            self.max_wait = config.get("max_wait", self.max_wait)
+            self._buckets.clear()
+
+    def acquire(self, api_base, deployment, tokens, timeout=None) -> Reservation:
+        """ Wait until request fits the buckets and charge it """
+        key, deadline = self._begin(api_base, deployment, timeout)
+        started = time.monotonic()
+        waited = False
+        try:
+            while True:
+                wait = self._try_acquire(key, tokens, deadline)
+                if wait is None:
+                    return Reservation(key, tokens)
+                waited = True
+                time.sleep(wait)
+        finally:
+            self._count_wait(waited, started)
+
+    async def acquire_async(self, api_base, deployment, tokens, timeout=None) -> Reservation:
+        """ Event loop variant of acquire """
+        key, deadline = self._begin(api_base, deployment, timeout)
+        started = time.monotonic()
+        waited = False
+        try:
+            while True:
+                wait = self._try_acquire(key, tokens, deadline)
+                if wait is None:
+                    return Reservation(key, tokens)
+                waited = True
+                await asyncio.sleep(wait)
+        finally:
+            self._count_wait(waited, started)
+
+    def complete(self, reservation: Reservation, headers=None, used_tokens=None):
+        """ Reconcile charged tokens with reported usage and remaining quota headers """
+        with self._lock:
+            bucket = self._buckets.get(reservation.key)
+            if bucket is None:
+                return
+            bucket.refill(time.monotonic())
+            #
+            if used_tokens is not None and bucket.tpm:
+                bucket.tokens = min(bucket.tpm, bucket.tokens + reservation.tokens - used_tokens)
+            #
+            if headers is not None:
+                remaining_tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+                if remaining_tokens is not None and bucket.tpm:
+                    bucket.tokens = min(bucket.tokens, remaining_tokens)
+                remaining_requests = _header_int(headers, "x-ratelimit-remaining-requests")
+                if remaining_requests is not None and bucket.rpm:
+                    bucket.requests = min(bucket.requests, remaining_requests)
+
+    def throttle(self, reservation: Reservation, headers=None):
+        """ Pause deployment after 429 """
+        delay = retry_after_seconds(headers)
+        if delay is None:
+            delay = 1.0
+        #
+        with self._lock:
+            self.throttled += 1
+            bucket = self._buckets.get(reservation.key)
+            if bucket is None:
+                return
+            now = time.monotonic()
+            bucket.refill(now)
+            bucket.blocked_until = max(bucket.blocked_until, now + delay)
+            if bucket.tpm:
+                bucket.tokens = min(bucket.tokens, 0.0)
+
+    def stats(self) -> dict:
+        """ Get limiter counters """
+        now = time.monotonic()
+        with self._lock:
+            buckets = {}
+            for key, bucket in self._buckets.items():
+                bucket.refill(now)
+                buckets["|".join(key)] = {
+                    "tokens": bucket.tokens if bucket.tpm else None,
+                    "requests": bucket.requests if bucket.rpm else None,
+                    "blocked_for": max(bucket.blocked_until - now, 0.0),
+                }
+            return {
+                "enabled": self.enabled,
+                "buckets": buckets,
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "wait_seconds": self.wait_seconds,
+                "timeouts": self.timeouts,
+                "throttled": self.throttled,
+            }
+
+    def _begin(self, api_base, deployment, timeout):
+        if timeout is None:
+            timeout = self.max_wait
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        return (api_base, deployment), deadline
+
+    def _try_acquire(self, key, tokens, deadline):
+        """ Charge request and return None, or return seconds to sleep before next try """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                limits = self.deployments.get(key[1], {})
+                bucket = _Bucket(limits.get("tpm", self.tpm), limits.get("rpm", self.rpm), now)
+                self._buckets[key] = bucket
+            bucket.refill(now)
+            #
+            wait = bucket.wait_time(tokens, now)
+            if wait <= 0:
+                if bucket.tpm:
+                    bucket.tokens -= tokens
+                if bucket.rpm:
+                    bucket.requests -= 1
+                self.acquired += 1
+                return None
+            #
+            if deadline is not None and now + wait > deadline:
+                self.timeouts += 1
+                raise RateLimitTimeout(
+                    f"Rate limit for {key[1]} needs {wait:.1f}s wait, past request deadline"
+                )
+            #
+            return wait
+
+    def _count_wait(self, waited, started):
+        """ Count request that had to wait (once per acquire, however many sleeps it took) """
+        if not waited:
+            return
+        with self._lock:
+            self.waited += 1
+            self.wait_seconds += time.monotonic() - started
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Exact-match response cache """
+
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:  # pylint: disable=R0902
+    """
+        Opt-in cache of deterministic chat/completion results
+
+        Key is a canonical hash of (project, endpoint, deployment, api_version, final request
+        params), so messages are hashed after limit_conversation. Entries are stored as JSON
+        text: hits return a fresh copy and size accounting is exact
+    """
+
+    def __init__(
+            self, enabled=False, ttl=3600, max_bytes=64 * 1024 * 1024,
+            require_zero_temperature=True,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.require_zero_temperature = require_zero_temperature
+        #
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, payload)
+        self._bytes = 0
+        #
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.oversize = 0
+
+    def configure(self, config: dict):
+        """ Apply cache config """
+        with self._lock:
+            self.enabled = config.get("enabled", self.enabled)
+            self.ttl = config.get("ttl", self.ttl)
+            self.max_bytes = config.get("max_bytes", self.max_bytes)
+            self.require_zero_temperature = config.get(
+                "require_zero_temperature", self.require_zero_temperature
+            )
+            self._evict()
+
+    def make_key(self, project_id, api_base, api_version, params: dict):
+        """ Get cache key for request params, None when request is not cacheable """
+        if not self.enabled:
+            return None
+        #
+        if params.get("stream") or (params.get("n") or 1) > 1 or \
+                (self.require_zero_temperature and params.get("temperature") != 0):
+            with self._lock:
+                self.skipped += 1
+            return None
+        #
+        payload = json.dumps(
+            [project_id, api_base, api_version, params],
+            sort_keys=True, separators=(",", ":"), default=str,
+        )
+        return hashlib.sha256(payload.encode()).digest()
+
+    def get(self, key):
+        """ Get copy of cached result marked with cached=True, or None """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            payload = entry[1]
+        #
+        result = json.loads(payload)
+        result["cached"] = True
+        return result
+
+    def put(self, key, result: dict):
+        """ Store result """
+        payload = json.dumps(result, separators=(",", ":"))
+        with self._lock:
+            if len(payload) > self.max_bytes:
+                # would evict every other entry and then itself
+                self.oversize += 1
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, payload)
+            self._bytes += len(payload)
+            self._evict()
+
+    def clear(self):
+        """ Drop all entries """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """ Get cache counters """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "oversize": self.oversize,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _drop(self, key):
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+
+
+response_cache = ResponseCache()
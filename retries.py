@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Upstream call retries """
+
+import asyncio
+import random
+import threading
+import time
+
+import openai  # pylint: disable=E0401
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from .rate_limits import retry_after_seconds
+
+
+RETRYABLE_STATUS_CODES = frozenset([408, 409, 429, 500, 502, 503, 504])
+
+
+def classify_error(exc):
+    """ Get (reason, retry_after) for retryable error, None for errors that must not be retried """
+    if isinstance(exc, openai.APITimeoutError):
+        return "timeout", None
+    if isinstance(exc, openai.APIConnectionError):
+        return "connection", None
+    if isinstance(exc, openai.APIStatusError):
+        headers = exc.response.headers
+        if headers.get("x-should-retry") == "false":
+            return None
+        if exc.status_code in RETRYABLE_STATUS_CODES or headers.get("x-should-retry") == "true":
+            return str(exc.status_code), retry_after_seconds(headers)
+    return None
+
+
+class RetryPolicy:  # pylint: disable=R0902
+    """
+        Retries of transient upstream errors with decorrelated jitter backoff
+
+        Server provided retry-after-ms / retry-after wins over computed backoff. No attempt
+        is started that would sleep past the request deadline. Pooled clients are created with
+        max_retries=0 while enabled, so the SDK does not retry on its own
+    """
+
+    def __init__(
+            self, enabled=False, max_attempts=4, base_delay=0.5, max_delay=20.0,
+            deadline=60.0, attempt_timeout=None,
+    ):
+        self.enabled = enabled
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        #
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.attempts = 0
+        self.retries = {}  # reason -> count
+        self.recovered = 0
+        self.exhausted = 0
+        self.sleep_seconds = 0.0
+
+    def configure(self, config: dict):
+        """ Apply policy config """
+        for key in [
+                "enabled", "max_attempts", "base_delay", "max_delay", "deadline", "attempt_timeout",
+        ]:
+            if key in config:
+                setattr(self, key, config[key])
+
+    def descriptor_kwargs(self) -> dict:
+        """ Get retry kwargs for LangChain targets in worker descriptors (empty when disabled) """
+        if not self.enabled:
+            return {}
+        result = {"max_retries": self.max_attempts - 1}
+        if self.attempt_timeout is not None:
+            result["timeout"] = self.attempt_timeout
+        return result
+
+    def call(self, function, deadline=None):
+        """ Call function() with retries """
+        if not self.enabled:
+            return function()
+        #
+        state = self._start(deadline)
+        while True:
+            try:
+                result = function()
+            except Exception as exc:  # pylint: disable=W0703
+                delay = self._next_delay(state, exc)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._finish(state)
+            return result
+
+    async def acall(self, coroutine_function, deadline=None):
+        """ Event loop variant of call """
+        if not self.enabled:
+            return await coroutine_function()
+        #
+        state = self._start(deadline)
+        while True:
+            try:
+                result = await coroutine_function()
+            except Exception as exc:  # pylint: disable=W0703
+                delay = self._next_delay(state, exc)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._finish(state)
+            return result
+
+    def stats(self) -> dict:
+        """ Get retry counters """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "calls": self.calls,
+                "attempts": self.attempts,
+                "retries": dict(self.retries),
+                "recovered": self.recovered,
+                "exhausted": self.exhausted,
+                "sleep_seconds": self.sleep_seconds,
+            }
+
+    def _start(self, deadline):
+        if deadline is None and self.deadline is not None:
+            deadline = time.monotonic() + self.deadline
+        with self._lock:
+            self.calls += 1
+            self.attempts += 1
+        return {"attempt": 1, "deadline": deadline, "delay": self.base_delay}
+
+    def _finish(self, state):
+        if state["attempt"] > 1:
+            with self._lock:
+                self.recovered += 1
+
+    def _next_delay(self, state, exc):
+        """ Get delay before next attempt, None to give up """
+        classified = classify_error(exc)
+        if classified is None:
+            return None
+        reason, retry_after = classified
+        #
+        if state["attempt"] >= self.max_attempts:
+            with self._lock:
+                self.exhausted += 1
+            return None
+        #
+        # decorrelated jitter: sleep = min(cap, random(base, previous * 3))
+        delay = min(self.max_delay, random.uniform(self.base_delay, state["delay"] * 3))
+        state["delay"] = delay
+        if retry_after is not None:
+            delay = retry_after
+        #
+        if state["deadline"] is not None and time.monotonic() + delay > state["deadline"]:
+            with self._lock:
+                self.exhausted += 1
+            return None
+        #
+        state["attempt"] += 1
+        with self._lock:
+            self.attempts += 1
+            self.retries[reason] = self.retries.get(reason, 0) + 1
+            self.sleep_seconds += delay
+        log.warning(
+            "Upstream error (%s), retry %s/%s in %.2fs",
+            reason, state["attempt"] - 1, self.max_attempts - 1, delay,
+        )
+        return delay
+
+
+retry_policy = RetryPolicy()
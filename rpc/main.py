@@ -1,10 +1,28 @@
 from pylon.core.tools import log  # pylint: disable=E0611,E0401
 from pylon.core.tools import web
+from time import perf_counter
 from traceback import format_exc
 
 from tools import rpc_tools, worker_client, this, context, SecretString
+from ..breakers import circuit_breakers
+from ..clients import client_pool, async_client_pool
+from ..model_catalog import model_catalog, catalog_key
 from ..models.integration_pd import AIModel, AzureOpenAISettings
-from ..utils import predict_chat, predict_text, predict_chat_from_request, predict_from_request
+from ..profiles import invocation_profiles, parsed_settings, parse_settings as parse_integration_settings
+from ..secrets_cache import secret_cache
+from ..token_limits import token_limits
+from ..tokens import token_memo
+from ..embeddings import embedding_cache, embedding_batcher, query_coalescer, \
+    embed_documents, embed_query
+from ..endpoints import endpoint_balancer
+from ..engine import async_engine
+from ..hedging import hedging_policy
+from ..rate_limits import rate_limiter
+from ..response_cache import response_cache
+from ..retries import retry_policy
+from ..semantic_cache import semantic_cache
+from ..utils import predict_chat, predict_text, predict_chat_from_request, predict_from_request, \
+    submit_chat, submit_text, submit_chat_from_request, submit_from_request
 
 try:
     from pydantic.v1 import ValidationError
@@ -17,24 +35,45 @@ class RPC:
 
     @web.rpc(f'{integration_name}__predict')
     @rpc_tools.wrap_exceptions(RuntimeError)
-    def predict(self, project_id, settings, prompt_struct):
-        """ Predict function """
-        models = settings.get('models', [])
-        capabilities = next((model['capabilities'] for model in models if model['id'] == settings['model_name']), {})
+    def predict(self, project_id, settings, prompt_struct, incremental=False):
+        """ Predict function
 
+            With incremental=True and settings.stream, response is a generator of
+            text/attachment messages yielded as they arrive (in-process callers only)
+        """
+        lookup = None
         try:
+            integration_settings = parse_integration_settings(settings)
+            model_name = integration_settings.model_name
+            capabilities = integration_settings.model_registry.capabilities(model_name)
+            if not capabilities.get('chat_completion') and not capabilities.get('completion'):
+                raise Exception(f"Model {model_name} does not support chat or text completion")
+            #
+            if not incremental:
+                lookup = semantic_cache.lookup(project_id, settings, prompt_struct)
+                if lookup is not None and lookup.result is not None:
+                    return {"ok": True, "response": lookup.result}
+            #
+            start = perf_counter()
             if capabilities.get('chat_completion'):
-                log.info('Using chat prediction for model: %s', settings['model_name'])
-                result = predict_chat(project_id, settings, prompt_struct)
-            elif capabilities.get('completion'):
-                log.info('Using completion(text) prediction for model: %s', settings['model_name'])
-                result = predict_text(project_id, settings, prompt_struct)
+                log.info('Using chat prediction for model: %s', model_name)
+                if async_engine.enabled and not incremental:
+                    result = submit_chat(project_id, integration_settings, prompt_struct).result()
+                else:
+                    result = predict_chat(project_id, integration_settings, prompt_struct, incremental=incremental)
             else:
-                raise Exception(f"Model {settings['model_name']} does not support chat or text completion")
+                log.info('Using completion(text) prediction for model: %s', model_name)
+                if async_engine.enabled:
+                    result = submit_text(project_id, integration_settings, prompt_struct).result()
+                else:
+                    result = predict_text(project_id, integration_settings, prompt_struct)
         except Exception as e:
             log.error(format_exc())
             return {"ok": False, "error": f"{type(e)}: {str(e)}"}
 
+        if lookup is not None:
+            semantic_cache.store(lookup, result, perf_counter() - start)
+
         return {"ok": True, "response": result}
 
 
@@ -43,7 +82,10 @@ class RPC:
     def chat_completion(self, project_id, settings, request_data):
         """ Chat completion function """
         try:
-            result = predict_chat_from_request(project_id, settings, request_data)
+            if async_engine.enabled and not request_data.get('stream'):
+                result = submit_chat_from_request(project_id, settings, request_data).result()
+            else:
+                result = predict_chat_from_request(project_id, settings, request_data)
         except Exception as e:
             log.error(str(e))
             return {"ok": False, "error": f"{str(e)}"}
@@ -55,13 +97,40 @@ class RPC:
     def completion(self, project_id, settings, request_data):
         """ Completion function """
         try:
-            result = predict_from_request(project_id, settings, request_data)
+            if async_engine.enabled and not request_data.get('stream'):
+                result = submit_from_request(project_id, settings, request_data).result()
+            else:
+                result = predict_from_request(project_id, settings, request_data)
         except Exception as e:
             log.error(str(e))
             return {"ok": False, "error": f"{str(e)}"}
 
         return {"ok": True, "response": result}
 
+    @web.rpc(f'{integration_name}__embed_documents')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def embed_documents(self, settings, texts, output_format="list"):
+        """ Embed texts through local embedding cache, see embeddings.format_embeddings for formats """
+        try:
+            result = embed_documents(settings, texts, output_format)
+        except Exception as e:
+            log.error(format_exc())
+            return {"ok": False, "error": f"{type(e)}: {str(e)}"}
+
+        return {"ok": True, "response": result}
+
+    @web.rpc(f'{integration_name}__embed_query')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def embed_query(self, settings, text, output_format="list"):
+        """ Embed text through local embedding cache """
+        try:
+            result = embed_query(settings, text, output_format)
+        except Exception as e:
+            log.error(format_exc())
+            return {"ok": False, "error": f"{type(e)}: {str(e)}"}
+
+        return {"ok": True, "response": result}
+
     @web.rpc(f'{integration_name}__parse_settings')
     @rpc_tools.wrap_exceptions(RuntimeError)
     def parse_settings(self, settings) -> dict:
@@ -72,6 +141,46 @@ class RPC:
         return {"ok": True, "item": settings}
 
 
+    @web.rpc(f'{integration_name}__stats')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def stats(self) -> dict:
+        """ Cache and registry counters """
+        module = context.module_manager.module.open_ai_azure
+        return {
+            "token_limits": token_limits.stats(),
+            "token_memo": token_memo.stats(),
+            "client_pool": client_pool.stats(),
+            "async_client_pool": async_client_pool.stats(),
+            "async_engine": async_engine.stats(),
+            "invocation_profiles": invocation_profiles.stats(),
+            "parsed_settings": parsed_settings.stats(),
+            "secret_cache": secret_cache.stats(),
+            "embedding_cache": embedding_cache.stats(),
+            "embedding_batcher": embedding_batcher.stats(),
+            "embed_query_coalescer": query_coalescer.stats(),
+            "response_cache": response_cache.stats(),
+            "semantic_cache": semantic_cache.stats(),
+            "model_catalog": model_catalog.stats(),
+            "rate_limits": rate_limiter.stats(),
+            "retries": retry_policy.stats(),
+            "endpoints": endpoint_balancer.stats(),
+            "circuit_breakers": circuit_breakers.stats(),
+            "hedging": hedging_policy.stats(),
+            "ad_tokens": module.ad_token_manager.stats() if module.ad_token_manager is not None else None,
+        }
+
+    @web.rpc(f'{integration_name}__circuit_breakers')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def circuit_breaker_states(self) -> dict:
+        """ Circuit state per (api_base, deployment) """
+        return circuit_breakers.states()
+
+    @web.rpc(f'{integration_name}__invalidate_secrets')
+    @rpc_tools.wrap_exceptions(RuntimeError)
+    def invalidate_secrets(self, project_id=None):
+        """ Drop cached secret values, e.g. after rotation """
+        secret_cache.invalidate(project_id)
+
     @web.rpc(f'{integration_name}_set_models', 'set_models')
     @rpc_tools.wrap_exceptions(RuntimeError)
     def set_models(self, payload: dict):
@@ -89,13 +198,22 @@ class RPC:
                     payload['settings'].get('api_token', {})
                 )
             #
-            settings["api_token"] = token_field.unsecret(payload.get('project_id'))
-        else:
-            settings["azure_ad_token"] = module.ad_token_provider()
+            settings["api_token"] = secret_cache.resolve(
+                payload.get('project_id'), token_field,
+                lambda: token_field.unsecret(payload.get('project_id')),
+            )
+        #
+        def _get_models():
+            if module.ad_token_provider is not None:
+                settings["azure_ad_token"] = module.ad_token_provider()
+            return worker_client.ai_get_models(
+                integration_name=this.module_name,
+                settings=settings,
+            )
         #
-        raw_models = worker_client.ai_get_models(
-            integration_name=this.module_name,
-            settings=settings,
+        raw_models = model_catalog.get(
+            catalog_key(settings["api_base"], settings["api_version"], settings.get("api_token")),
+            _get_models, force=payload.get('force_refresh', False),
         )
         #
         return [AIModel(**model).dict() for model in raw_models]
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Resolved secrets cache """
+
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def _zero(buffer: bytearray):
+    buffer[:] = bytes(len(buffer))
+
+
+class SecretCache:  # pylint: disable=R0902
+    """
+        Short-lived cache of unsecreted values keyed by (project_id, secret reference)
+
+        Values are kept in bytearrays which are zeroed when entries expire, get evicted
+        or invalidated. Note: str copies handed to callers are outside of our control
+    """
+
+    def __init__(self, enabled=True, ttl=60, max_entries=1024):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        #
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (project_id, expires_at, bytearray)
+        #
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def configure(self, config: dict):
+        """ Apply cache config """
+        self.enabled = config.get("enabled", self.enabled)
+        self.ttl = config.get("ttl", self.ttl)
+        self.max_entries = config.get("max_entries", self.max_entries)
+        #
+        if not self.enabled:
+            self.invalidate()
+
+    def resolve(self, project_id, reference, resolver) -> str:
+        """ Get resolved secret, calling resolver() on miss """
+        if not self.enabled:
+            return resolver()
+        #
+        key = (project_id, self._reference_digest(reference))
+        now = time.monotonic()
+        #
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return entry[2].decode()
+                self._drop(key)
+            self.misses += 1
+        #
+        value = resolver()
+        if not isinstance(value, str):
+            return value
+        #
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (project_id, now + self.ttl, bytearray(value.encode()))
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+        #
+        return value
+
+    def invalidate(self, project_id=None):
+        """ Drop (and zero) entries of one project or all of them """
+        with self._lock:
+            for key in [
+                    key for key, entry in self._entries.items()
+                    if project_id is None or entry[0] == project_id
+            ]:
+                self._drop(key)
+
+    def stats(self) -> dict:
+        """ Get cache counters """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evicted": self.evicted,
+            }
+
+    def _drop(self, key):
+        _, _, buffer = self._entries.pop(key)
+        _zero(buffer)
+        self.evicted += 1
+
+    @staticmethod
+    def _reference_digest(reference):
+        if not isinstance(reference, str):
+            reference = json.dumps(reference, sort_keys=True, default=str)
+        return hashlib.sha256(reference.encode()).hexdigest()
+
+
+secret_cache = SecretCache()
@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Semantic response cache """
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Any
+
+try:
+    import numpy as np  # pylint: disable=E0401
+except ImportError:  # pragma: no cover
+    np = None
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from .embeddings import embed_query
+from .profiles import parse_settings, settings_fingerprint
+from .secrets_cache import secret_cache
+
+
+class SemanticLookup(NamedTuple):
+    """ Result of lookup, passed back to store() on miss """
+    index_key: tuple
+    vector: Any
+    result: Any
+
+
+class _Index:  # pylint: disable=R0903
+    """ Brute-force cosine index: normalized float32 rows, LRU row replacement when full """
+
+    def __init__(self, dimensions, capacity):
+        self.capacity = capacity
+        self.vectors = np.zeros((min(capacity, 16), dimensions), dtype=np.float32)
+        self.last_used = np.zeros(len(self.vectors), dtype=np.float64)
+        self.entries = []  # (result JSON, upstream latency)
+        self.size = 0
+
+    def search(self, vector):
+        """ Get (row, similarity) of nearest entry """
+        if not self.size:
+            return None, 0.0
+        similarities = self.vectors[:self.size] @ vector
+        row = int(np.argmax(similarities))
+        return row, float(similarities[row])
+
+    def add(self, vector, entry, now):
+        """ Add entry, returns True when an old one was evicted """
+        evicted = self.size >= self.capacity
+        if evicted:
+            row = int(np.argmin(self.last_used[:self.size]))
+            self.entries[row] = entry
+        else:
+            if self.size == len(self.vectors):
+                grow = min(len(self.vectors) * 2, self.capacity)
+                self.vectors = np.resize(self.vectors, (grow, self.vectors.shape[1]))
+                self.last_used = np.resize(self.last_used, grow)
+            row = self.size
+            self.size += 1
+            self.entries.append(entry)
+        #
+        self.vectors[row] = vector
+        self.last_used[row] = now
+        return evicted
+
+
+class SemanticCache:  # pylint: disable=R0902
+    """
+        Optional cache of predict results matched by embedding similarity of the user input
+
+        Indexes are scoped per (project, model, fingerprint of everything else in the request:
+        context, examples, history and sampling settings), so only the final user input is
+        compared semantically
+    """
+
+    def __init__(
+            self, enabled=False, embedding_model=None, threshold=0.95,
+            max_entries_per_index=1000, max_indexes=256,
+    ):
+        self.enabled = enabled
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.max_entries_per_index = max_entries_per_index
+        self.max_indexes = max_indexes
+        #
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()  # index_key -> _Index
+        #
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.evicted = 0
+        self.lookup_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def configure(self, config: dict):
+        """ Apply cache config """
+        with self._lock:
+            self.enabled = config.get("enabled", self.enabled)
+            self.embedding_model = config.get("embedding_model", self.embedding_model)
+            self.threshold = config.get("threshold", self.threshold)
+            self.max_entries_per_index = config.get("max_entries_per_index", self.max_entries_per_index)
+            self.max_indexes = config.get("max_indexes", self.max_indexes)
+            self._indexes.clear()
+        #
+        if self.enabled and (np is None or not self.embedding_model):
+            log.warning("Semantic cache needs numpy and embedding_model, disabling")
+            self.enabled = False
+
+    def lookup(self, project_id, settings: dict, prompt_struct: dict):
+        """ Find cached result for predict request, None when request is not cacheable """
+        if not self.enabled or not prompt_struct.get("prompt"):
+            return None
+        #
+        start = time.perf_counter()
+        try:
+            vector = self._embed(project_id, settings, prompt_struct["prompt"])
+        except Exception:  # pylint: disable=W0703
+            log.exception("Semantic cache lookup failed, calling model")
+            with self._lock:
+                self.errors += 1
+            return None
+        #
+        index_key = (project_id, settings.get("model_name"), self._context_fingerprint(settings, prompt_struct))
+        result = None
+        with self._lock:
+            index = self._indexes.get(index_key)
+            if index is not None:
+                self._indexes.move_to_end(index_key)
+                row, similarity = index.search(vector)
+                if row is not None and similarity >= self.threshold:
+                    index.last_used[row] = time.monotonic()
+                    payload, latency = index.entries[row]
+                    result = json.loads(payload)
+                    result["cached"] = True
+            #
+            lookup_seconds = time.perf_counter() - start
+            self.lookup_seconds += lookup_seconds
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.saved_seconds += max(latency - lookup_seconds, 0.0)
+        #
+        return SemanticLookup(index_key, vector, result)
+
+    def store(self, lookup: SemanticLookup, result: dict, latency: float):
+        """ Remember result of missed lookup """
+        entry = (json.dumps(result, separators=(",", ":")), latency)
+        with self._lock:
+            index = self._indexes.get(lookup.index_key)
+            if index is None:
+                index = _Index(len(lookup.vector), self.max_entries_per_index)
+                self._indexes[lookup.index_key] = index
+                while len(self._indexes) > self.max_indexes:
+                    self._indexes.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._indexes.move_to_end(lookup.index_key)
+            #
+            if index.add(lookup.vector, entry, time.monotonic()):
+                self.evicted += 1
+
+    def invalidate(self, project_id=None):
+        """ Drop indexes of one project or all of them """
+        with self._lock:
+            for index_key in [
+                    index_key for index_key in self._indexes
+                    if project_id is None or index_key[0] == project_id
+            ]:
+                self._indexes.pop(index_key)
+
+    def stats(self) -> dict:
+        """ Get cache counters """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "indexes": len(self._indexes),
+                "entries": sum(index.size for index in self._indexes.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "evicted": self.evicted,
+                "hit_rate": self.hits / total if total else 0.0,
+                "lookup_seconds": self.lookup_seconds,
+                "saved_seconds": self.saved_seconds,
+            }
+
+    def _embed(self, project_id, settings: dict, text: str):
+        integration_settings = parse_settings(settings)
+        api_token = secret_cache.resolve(
+            project_id, integration_settings.api_token,
+            lambda: integration_settings.api_token.unsecret(project_id),
+        )
+        vector = embed_query({
+            "model_name": self.embedding_model,
+            "integration_data": {"settings": {
+                "api_base": integration_settings.api_base,
+                "api_version": integration_settings.api_version,
+                "api_token": api_token,
+            }},
+        }, text, "float32")
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    @staticmethod
+    def _context_fingerprint(settings: dict, prompt_struct: dict) -> str:
+        return settings_fingerprint({
+            "prompt_struct": {key: value for key, value in prompt_struct.items() if key != "prompt"},
+            "settings": {
+                key: settings.get(key)
+                for key in ("api_base", "api_version", "temperature", "top_p", "max_tokens", "stream")
+            },
+        })
+
+
+semantic_cache = SemanticCache()
@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Token limits registry """
+
+import json
+import threading
+import time
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+from tools import VaultClient  # pylint: disable=E0611,E0401
+
+
+TOKEN_LIMITS_SECRET = 'open_ai_azure_token_limits'
+
+
+class TokenLimitRegistry:  # pylint: disable=R0902
+    """
+        Process-local cache of token limits stored in Vault
+
+        First access loads limits synchronously, after that the parsed dict
+        is served from memory and refreshed in background once TTL expires
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        #
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._limits = None
+        self._loaded_at = 0.0
+        self._refreshing = False
+        #
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def get_all(self) -> dict:
+        """ Get all limits (do not mutate returned dict) """
+        with self._lock:
+            if self._limits is not None:
+                self.hits += 1
+                if time.monotonic() - self._loaded_at > self.ttl and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(
+                        target=self._background_refresh,
+                        name="open_ai_azure_token_limits",
+                        daemon=True,
+                    ).start()
+                return self._limits
+            #
+            self.misses += 1
+        #
+        with self._load_lock:
+            if self._limits is None:
+                self._load()
+            return self._limits
+
+    def get(self, model, default=None):
+        """ Get limit for model """
+        return self.get_all().get(model, default)
+
+    def invalidate(self):
+        """ Drop cached limits, next access reloads them """
+        with self._lock:
+            self._limits = None
+            self._loaded_at = 0.0
+
+    def stats(self) -> dict:
+        """ Get cache counters """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "errors": self.errors,
+                "loaded": self._limits is not None,
+                "age": time.monotonic() - self._loaded_at if self._limits is not None else None,
+                "ttl": self.ttl,
+            }
+
+    def _load(self):
+        secrets = VaultClient().get_all_secrets()
+        limits = json.loads(secrets.get(TOKEN_LIMITS_SECRET, ''))
+        #
+        with self._lock:
+            self._limits = limits
+            self._loaded_at = time.monotonic()
+            self.refreshes += 1
+
+    def _background_refresh(self):
+        try:
+            self._load()
+        except:  # pylint: disable=W0702
+            with self._lock:
+                self.errors += 1
+                self._loaded_at = time.monotonic()  # retry after another TTL
+            log.exception("Failed to refresh token limits, keeping cached values")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+
+token_limits = TokenLimitRegistry()
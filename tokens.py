@@ -0,0 +1,204 @@
+#!/usr/bin/python3
+# coding=utf-8
+
+#   Copyright 2025 EPAM Systems
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+""" Tokenizer registry """
+
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import tiktoken
+
+from pylon.core.tools import log  # pylint: disable=E0611,E0401
+
+
+class Tokenizer(NamedTuple):
+    """ Resolved encoding and per-message overhead for a model """
+    encoding: tiktoken.Encoding
+    tokens_per_message: int
+    tokens_per_name: int
+
+
+@functools.lru_cache(maxsize=256)
+def get_tokenizer(model: str) -> Tokenizer:
+    """ Resolve model to tokenizer once, see:
+        https://github.com/openai/openai-cookbook/blob/main/examples/How_to_format_inputs_to_ChatGPT_models.ipynb
+    """
+    if model in {
+        "gpt-3.5-turbo-0613",
+        "gpt-3.5-turbo-16k-0613",
+        "gpt-4-0314",
+        "gpt-4-32k-0314",
+        "gpt-4-0613",
+        "gpt-4-32k-0613",
+        }:
+        return Tokenizer(_get_encoding(model), 3, 1)
+    if model == "gpt-3.5-turbo-0301":
+        # every message follows <|start|>{role/name}\n{content}<|end|>\n
+        # if there's a name, the role is omitted
+        return Tokenizer(_get_encoding(model), 4, -1)
+    if "gpt-3.5-turbo" in model:
+        log.warning("Warning: gpt-3.5-turbo may update over time. Returning num tokens assuming gpt-3.5-turbo-0613.")
+        return get_tokenizer("gpt-3.5-turbo-0613")
+    if "gpt-4" in model:
+        log.warning("Warning: gpt-4 may update over time. Returning num tokens assuming gpt-4-0613.")
+        return get_tokenizer("gpt-4-0613")
+    return Tokenizer(_get_encoding(model), 4, -1)
+
+
+@functools.lru_cache(maxsize=256)
+def _get_encoding(model: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        log.warning("Warning: model %s not found. Using cl100k_base encoding.", model)
+        return tiktoken.get_encoding("cl100k_base")
+
+
+class TokenCountMemo:
+    """
+        LRU memo of per-message token counts
+
+        Keys are (tokenizer, digest of message items), so the same system prompt,
+        examples and older history are tokenized once across conversation turns.
+        Entry count is bounded; each entry holds only a 16-byte digest and an int
+    """
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        #
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        #
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(tokenizer, message):
+        """ Make memo key for message """
+        digest = hashlib.blake2b(digest_size=16)
+        for key, value in message.items():
+            digest.update(key.encode())
+            digest.update(b"\0")
+            digest.update(value.encode())
+            digest.update(b"\0")
+        #
+        return (
+            tokenizer.encoding.name, tokenizer.tokens_per_message, tokenizer.tokens_per_name,
+            digest.digest(),
+        )
+
+    def get_many(self, keys):
+        """ Get counts for keys, None for misses """
+        result = []
+        with self._lock:
+            for key in keys:
+                count = self._entries.get(key)
+                if count is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                result.append(count)
+        return result
+
+    def put_many(self, items):
+        """ Store (key, count) pairs """
+        with self._lock:
+            for key, count in items:
+                self._entries[key] = count
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """ Drop all entries """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """ Get memo counters """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+token_memo = TokenCountMemo()
+
+
+def message_token_counts(messages: list, model: str) -> list:
+    """ Count tokens per message, tokenizing only messages missing in memo """
+    tokenizer = get_tokenizer(model)
+    #
+    if token_memo.max_entries <= 0:
+        return _count_messages(tokenizer, messages)
+    #
+    keys = [TokenCountMemo.make_key(tokenizer, message) for message in messages]
+    counts = token_memo.get_many(keys)
+    #
+    missing = [idx for idx, count in enumerate(counts) if count is None]
+    if missing:
+        missing_counts = _count_messages(tokenizer, [messages[idx] for idx in missing])
+        for idx, count in zip(missing, missing_counts):
+            counts[idx] = count
+        token_memo.put_many((keys[idx], counts[idx]) for idx in missing)
+    #
+    return counts
+
+
+def count_message_tokens(messages: list, model: str) -> int:
+    """ Count tokens of a message list """
+    return sum(message_token_counts(messages, model))
+
+
+def _count_messages(tokenizer, messages):
+    """
+        Count tokens per message, encoding values one by one with encoded_lengths
+
+        Batched / threaded encoding showed no gain for message-sized values and was
+        dropped, see benchmarks/tokens.py
+    """
+    texts = []
+    owners = []
+    counts = []
+    for idx, message in enumerate(messages):
+        count = tokenizer.tokens_per_message
+        for key, value in message.items():
+            texts.append(value)
+            owners.append(idx)
+            if key == "name":
+                count += tokenizer.tokens_per_name
+        counts.append(count)
+    #
+    for idx, length in zip(owners, encoded_lengths(tokenizer.encoding, texts)):
+        counts[idx] += length
+    #
+    return counts
+
+
+def encoded_lengths(encoding: tiktoken.Encoding, texts: list) -> list:
+    """ Get token counts of many strings """
+    encode = encoding.encode
+    return [len(encode(text)) for text in texts]
@@ -1,110 +1,121 @@
-# FIXME: ChatCompletion and Completion are not adapted for managed identity and openai > 1.0.0
-
-from collections import deque
-from openai import ChatCompletion, Completion
-import tiktoken
-from .models.integration_pd import IntegrationModel
+import asyncio
+from bisect import bisect_right
+from concurrent.futures import Future
+from itertools import accumulate
+from operator import attrgetter
+from time import perf_counter
+from typing import NamedTuple
+
+import openai
+
+from .breakers import circuit_breakers, is_endpoint_failure, CircuitOpen
+from .clients import client_pool, async_client_pool
+from .endpoints import Endpoint, endpoint_balancer
+from .engine import async_engine
+from .hedging import hedging_policy
+from .profiles import parse_settings
+from .rate_limits import rate_limiter, RateLimitTimeout
+from .response_cache import response_cache
+from .retries import retry_policy
+from .secrets_cache import secret_cache
 from .models.request_body import ChatCompletionRequestBody, CompletionRequestBody
+from .tokens import count_message_tokens, message_token_counts, get_tokenizer, encoded_lengths
 
 from pylon.core.tools import log
+from tools import context
 
 
-def init_openai(settings, project_id):
-    return {
-        'api_key': settings.api_token.unsecret(project_id),
-        'api_type': settings.api_type,
-        'api_version': settings.api_version,
-        'api_base': settings.api_base
-    }
+def init_openai(settings, project_id, pool=client_pool):
+    """ Get pooled AzureOpenAI client for settings """
+    return endpoint_client(
+        Endpoint(settings.api_base, settings.api_version, settings.api_token), project_id, pool,
+    )
+
+
+def endpoint_client(endpoint: Endpoint, project_id, pool=client_pool):
+    """ Get pooled AzureOpenAI client for endpoint """
+    module = context.module_manager.module.open_ai_azure
+    if module.ad_token_provider is None:
+        api_key = secret_cache.resolve(
+            project_id, endpoint.api_token,
+            lambda: endpoint.api_token.unsecret(project_id),
+        )
+        return pool.get(endpoint.api_base, endpoint.api_version, api_key=api_key)
+    return pool.get(
+        endpoint.api_base, endpoint.api_version,
+        azure_ad_token_provider=module.ad_token_provider,
+    )
+
+
+def init_clients(settings, project_id, deployment, pool=client_pool) -> list:
+    """ Get (endpoint, client) pairs for endpoints serving deployment """
+    return [
+        (endpoint, endpoint_client(endpoint, project_id, pool))
+        for endpoint in settings.endpoint_pool(deployment)
+    ]
+
+
+def _dump_stream(response):
+    for chunk in response:
+        yield chunk.model_dump()
 
 
 def num_tokens_from_messages(messages: list, model: str):
     """Return the number of tokens used by a list of messages.
     See: https://github.com/openai/openai-cookbook/blob/main/examples/How_to_format_inputs_to_ChatGPT_models.ipynb
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        log.warning("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    if model in {
-        "gpt-3.5-turbo-0613",
-        "gpt-3.5-turbo-16k-0613",
-        "gpt-4-0314",
-        "gpt-4-32k-0314",
-        "gpt-4-0613",
-        "gpt-4-32k-0613",
-        }:
-        tokens_per_message = 3
-        tokens_per_name = 1
-    elif model == "gpt-3.5-turbo-0301":
-        tokens_per_message = 4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
-        tokens_per_name = -1  # if there's a name, the role is omitted
-    elif "gpt-3.5-turbo" in model:
-        log.warning("Warning: gpt-3.5-turbo may update over time. Returning num tokens assuming gpt-3.5-turbo-0613.")
-        return num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613")
-    elif "gpt-4" in model:
-        log.warning("Warning: gpt-4 may update over time. Returning num tokens assuming gpt-4-0613.")
-        return num_tokens_from_messages(messages, model="gpt-4-0613")
-    else:
-        tokens_per_message = 4
-        tokens_per_name = -1
-    num_tokens = 0
-    for message in messages:
-        num_tokens += tokens_per_message
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
-            if key == "name":
-                num_tokens += tokens_per_name
-    # num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
-    return num_tokens
+    return count_message_tokens(messages, model)
 
 
-def limit_conversation(
-        conversation: dict, model_name: str, max_response_tokens: int, token_limit: int
-        ) -> list:
-        limited_conversation = []
-        remaining_tokens = token_limit - max_response_tokens
-        remaining_tokens -= 3  # every reply is primed with <|start|>assistant<|message|>
+class ConversationWindow(NamedTuple):
+    """ Part of conversation that fits token limit, as index bounds """
+    examples_end: int  # keep conversation['examples'][:examples_end]
+    history_start: int  # keep conversation['chat_history'][history_start:]
+    include_input: bool
+
 
-        context_tokens = num_tokens_from_messages(conversation['context'], model_name)
-        remaining_tokens -= context_tokens
+def conversation_window(
+        conversation: dict, model_name: str, max_response_tokens: int, token_limit: int
+        ) -> ConversationWindow:
+    remaining_tokens = token_limit - max_response_tokens
+    remaining_tokens -= 3  # every reply is primed with <|start|>assistant<|message|>
 
-        if remaining_tokens < 0:
-            raise Exception(
+    remaining_tokens -= sum(message_token_counts(conversation['context'], model_name))
+    if remaining_tokens < 0:
+        raise Exception(
 'There are no enough tokens to form messages for ChatCompletion. \
 Try using a lower value for the token limit parameter.'
 )
 
-        limited_conversation.extend(conversation['context'])
-
-        input_tokens = num_tokens_from_messages(conversation['input'], model_name)
-        remaining_tokens -= input_tokens
-        if remaining_tokens < 0:
-            return limited_conversation
-
-        final_examples = []
-        for example in conversation['examples']:
-            example_tokens = num_tokens_from_messages([example], model_name)
-            remaining_tokens -= example_tokens
-            if remaining_tokens < 0:
-                if len(final_examples) % 2:
-                    final_examples.pop()  # remove incomplete example if present
-                return limited_conversation + final_examples + conversation['input']
-            final_examples.append(example)
-
-        limited_conversation.extend(final_examples)
-
-        final_history = deque()
-        for message in reversed(conversation['chat_history']):
-            message_tokens = num_tokens_from_messages([message], model_name)
-            remaining_tokens -= message_tokens
-            if remaining_tokens < 0:
-                return limited_conversation + list(final_history) + conversation['input']
-            final_history.appendleft(message)
-        limited_conversation.extend(final_history)
-
-        limited_conversation.extend(conversation['input'])
+    history_length = len(conversation['chat_history'])
+
+    remaining_tokens -= sum(message_token_counts(conversation['input'], model_name))
+    if remaining_tokens < 0:
+        return ConversationWindow(0, history_length, False)
+
+    example_sums = list(accumulate(message_token_counts(conversation['examples'], model_name)))
+    examples_end = bisect_right(example_sums, remaining_tokens)
+    if examples_end < len(example_sums):
+        examples_end -= examples_end % 2  # remove incomplete example if present
+        return ConversationWindow(examples_end, history_length, True)
+    if example_sums:
+        remaining_tokens -= example_sums[-1]
+
+    # newest history first
+    history_sums = list(accumulate(reversed(message_token_counts(conversation['chat_history'], model_name))))
+    history_kept = bisect_right(history_sums, remaining_tokens)
+    return ConversationWindow(examples_end, history_length - history_kept, True)
+
+
+def limit_conversation(
+        conversation: dict, model_name: str, max_response_tokens: int, token_limit: int
+        ) -> list:
+        window = conversation_window(conversation, model_name, max_response_tokens, token_limit)
+
+        limited_conversation = conversation['context'] + conversation['examples'][:window.examples_end]
+        limited_conversation.extend(conversation['chat_history'][window.history_start:])
+        if window.include_input:
+            limited_conversation.extend(conversation['input'])
         return limited_conversation
 
 
@@ -235,31 +246,232 @@ def prepare_text_result(content):
     return structured_result
 
 
+def _iter_stream_deltas(response):
+    for chunk in response:
+        if not chunk['choices']:
+            continue  # e.g. prompt filter results chunk
+        delta = chunk['choices'][0]['delta']
+        if delta.get('content'):
+            yield True, delta['content']
+        else:
+            for attachment in _prepare_attachments(delta.get('custom_content', {}).get('attachments', [])):
+                yield False, attachment
+
+
+def iter_stream_result(response):
+    """ Yield normalized text and attachment messages as chunks arrive """
+    for is_text, delta in _iter_stream_deltas(response):
+        if is_text:
+            yield {
+                'type': 'text',
+                'content': delta
+            }
+        else:
+            yield delta
+
+
 def prepare_stream_result(response):
     structured_result = {'messages': []}
-    text_content = ''
+    text_parts = []
     attachments = []
-    for chunk in response:
-        if chunk['choices'][0]['delta'].get('content'):
-            text_content += chunk['choices'][0]['delta']['content']
+    for is_text, delta in _iter_stream_deltas(response):
+        if is_text:
+            text_parts.append(delta)
         else:
-            attachments += chunk['choices'][0]['delta'].get('custom_content', {}).get('attachments', [])
+            attachments.append(delta)
 
-    if text_content:
+    if text_parts:
         structured_result['messages'].append({
             'type': 'text',
-            'content': text_content
+            'content': ''.join(text_parts)
         })
 
-    if attachments:
-        structured_result['messages'] += _prepare_attachments(attachments)
+    structured_result['messages'] += attachments
 
     return structured_result
 
 
-def predict_chat(project_id: int, settings: dict, prompt_struct: dict) -> str:
-    settings = IntegrationModel.parse_obj(settings)
-    init_settings = init_openai(settings, project_id)
+def estimate_request_tokens(params: dict) -> int:
+    """ Estimate tokens charged for request: prompt tokens + max completion tokens """
+    model = params['model']
+    try:
+        if 'messages' in params:
+            prompt_tokens = count_message_tokens(params['messages'], model)
+        else:
+            prompt = params.get('prompt') or ''
+            prompts = [prompt] if isinstance(prompt, str) else list(prompt)
+            prompt_tokens = sum(encoded_lengths(get_tokenizer(model).encoding, prompts))
+    except (TypeError, ValueError, KeyError):
+        prompt_tokens = len(str(params.get('messages', params.get('prompt', '')))) // 4
+    #
+    return prompt_tokens + (params.get('max_tokens') or params.get('max_completion_tokens') or 0)
+
+
+def _usage_tokens(response):
+    usage = getattr(response, 'usage', None)
+    return usage.total_tokens if usage is not None else None
+
+
+def _create(clients: list, resource: str, params: dict):
+    """ Call <resource>.create(**params) (chat.completions / completions) with retries """
+    return retry_policy.call(lambda: _create_attempt(clients, resource, params))
+
+
+async def _acreate(clients: list, resource: str, params: dict):
+    """ Async variant of _create """
+    return await retry_policy.acall(lambda: _acreate_attempt(clients, resource, params))
+
+
+def _pick_client(clients: list, params: dict):
+    """ Pick endpoint whose circuit lets the call through, fail fast when none does """
+    deployment = params['model']
+    candidates = clients
+    while candidates:
+        idx = endpoint_balancer.choose([endpoint for endpoint, _ in candidates], deployment)
+        endpoint, client = candidates[idx]
+        permit = circuit_breakers.acquire(endpoint.api_base, deployment)
+        if permit is not None:
+            return endpoint, client, permit
+        candidates = candidates[:idx] + candidates[idx + 1:]
+    raise CircuitOpen(f"All endpoints of {deployment} have open circuits")
+
+
+def _create_attempt(clients: list, resource: str, params: dict):
+    """ Make one upstream call to picked endpoint """
+    endpoint, client, permit = _pick_client(clients, params)
+    start = perf_counter()
+    try:
+        response = _call_endpoint(endpoint, attrgetter(resource)(client), params)
+    except RateLimitTimeout:
+        # throttled locally, endpoint was not called
+        circuit_breakers.release(endpoint.api_base, params['model'], permit)
+        raise
+    except Exception as exc:
+        circuit_breakers.record(
+            endpoint.api_base, params['model'], is_endpoint_failure(exc), perf_counter() - start, permit,
+        )
+        raise
+    circuit_breakers.record(endpoint.api_base, params['model'], False, perf_counter() - start, permit)
+    return response
+
+
+async def _acreate_attempt(clients: list, resource: str, params: dict):
+    """ Async variant of _create_attempt, hedged to another endpoint when slow """
+    endpoint, client, permit = _pick_client(clients, params)
+    primary = _acreate_on(endpoint, client, permit, resource, params)
+    if not hedging_policy.applies(params['model']):
+        return await primary
+    #
+    def _hedge():
+        alternatives = [item for item in clients if item[0] != endpoint]
+        if not alternatives and hedging_policy.same_endpoint:
+            alternatives = clients
+        try:
+            hedge_endpoint, hedge_client, hedge_permit = _pick_client(alternatives, params)
+        except CircuitOpen:
+            return None
+        return _acreate_on(hedge_endpoint, hedge_client, hedge_permit, resource, params)
+    #
+    return await hedging_policy.run(params['model'], primary, _hedge)
+
+
+async def _acreate_on(endpoint: Endpoint, client, permit, resource: str, params: dict):
+    """ Make one upstream call to endpoint picked by _pick_client """
+    start = perf_counter()
+    try:
+        response = await _acall_endpoint(endpoint, attrgetter(resource)(client), params)
+    except (asyncio.CancelledError, RateLimitTimeout):
+        # cancelled or throttled locally, no endpoint outcome to record
+        circuit_breakers.release(endpoint.api_base, params['model'], permit)
+        raise
+    except Exception as exc:
+        circuit_breakers.record(
+            endpoint.api_base, params['model'], is_endpoint_failure(exc), perf_counter() - start, permit,
+        )
+        raise
+    circuit_breakers.record(endpoint.api_base, params['model'], False, perf_counter() - start, permit)
+    return response
+
+
+def _call_endpoint(endpoint: Endpoint, resource, params: dict):
+    """ Call resource.create(**params) under rate limiter """
+    with endpoint_balancer.track(endpoint, params['model']):
+        if not rate_limiter.enabled:
+            return resource.create(**params)
+        #
+        reservation = rate_limiter.acquire(
+            endpoint.api_base, params['model'], estimate_request_tokens(params),
+        )
+        try:
+            raw = resource.with_raw_response.create(**params)
+        except openai.RateLimitError as exc:
+            rate_limiter.throttle(reservation, exc.response.headers)
+            raise
+        response = raw.parse()
+        rate_limiter.complete(
+            reservation, raw.headers, None if params.get('stream') else _usage_tokens(response),
+        )
+        return response
+
+
+async def _acall_endpoint(endpoint: Endpoint, resource, params: dict):
+    """ Async variant of _call_endpoint, holds engine slot of endpoint while calling it """
+    with endpoint_balancer.track(endpoint, params['model']):
+        if not rate_limiter.enabled:
+            async with async_engine.slot(endpoint.api_base, params['model']):
+                return await resource.create(**params)
+        #
+        reservation = await rate_limiter.acquire_async(
+            endpoint.api_base, params['model'], estimate_request_tokens(params),
+        )
+        try:
+            async with async_engine.slot(endpoint.api_base, params['model']):
+                raw = await resource.with_raw_response.create(**params)
+        except openai.RateLimitError as exc:
+            rate_limiter.throttle(reservation, exc.response.headers)
+            raise
+        response = raw.parse()
+        rate_limiter.complete(
+            reservation, raw.headers, None if params.get('stream') else _usage_tokens(response),
+        )
+        return response
+
+
+def _cached(project_id: int, settings, params: dict, call):
+    """ Run call() through response cache (no-op for disabled cache and non-cacheable params) """
+    key = response_cache.make_key(project_id, settings.api_base, settings.api_version, params)
+    if key is not None:
+        result = response_cache.get(key)
+        if result is not None:
+            return result
+    #
+    result = call()
+    if key is not None:
+        response_cache.put(key, result)
+    return result
+
+
+def _submit_cached(project_id: int, settings, params: dict, call) -> Future:
+    """ Async engine variant of _cached, hits are returned as completed futures """
+    key = response_cache.make_key(project_id, settings.api_base, settings.api_version, params)
+    if key is not None:
+        result = response_cache.get(key)
+        if result is not None:
+            future = Future()
+            future.set_result(result)
+            return future
+    #
+    future = async_engine.submit(call)
+    if key is not None:
+        def _store(done):
+            if not done.cancelled() and done.exception() is None:
+                response_cache.put(key, done.result())
+        future.add_done_callback(_store)
+    return future
+
+
+def _prepare_chat(settings: dict, prompt_struct: dict):
+    settings = parse_settings(settings)
 
     stream = settings.stream
     token_limit = settings.token_limit
@@ -269,7 +481,7 @@ def predict_chat(project_id: int, settings: dict, prompt_struct: dict) -> str:
         prompt_struct, settings.model_name, max_tokens, token_limit)
 
     params = {
-        'engine': settings.model_name,
+        'model': settings.model_name,
         'temperature': settings.temperature,
         'top_p': settings.top_p,
         'messages': conversation,
@@ -278,15 +490,49 @@ def predict_chat(project_id: int, settings: dict, prompt_struct: dict) -> str:
         params['stream'] = stream
     else:
         params['max_tokens'] = settings.max_tokens
-    response = ChatCompletion.create(**params, **init_settings)
+    return settings, params
 
-    return prepare_stream_result(response) if stream else prepare_result(response)
 
+def predict_chat(project_id: int, settings: dict, prompt_struct: dict, incremental: bool = False) -> str:
+    settings, params = _prepare_chat(settings, prompt_struct)
+    clients = init_clients(settings, project_id, params['model'])
 
-def predict_chat_from_request(project_id: int, settings: dict, request_data: dict) -> str:
+    if not settings.stream:
+        return _cached(
+            project_id, settings, params,
+            lambda: prepare_result(_create(clients, 'chat.completions', params).model_dump()),
+        )
+
+    response = _create(clients, 'chat.completions', params)
+    if incremental:
+        return iter_stream_result(_dump_stream(response))
+    return prepare_stream_result(_dump_stream(response))
+
+
+def submit_chat(project_id: int, settings: dict, prompt_struct: dict) -> Future:
+    """ Async engine variant of predict_chat, prepares request on calling thread """
+    settings, params = _prepare_chat(settings, prompt_struct)
+    clients = init_clients(settings, project_id, params['model'], pool=async_client_pool)
+
+    async def call():
+        response = await _acreate(clients, 'chat.completions', params)
+        if not settings.stream:
+            return prepare_result(response.model_dump())
+        return prepare_stream_result([chunk.model_dump() async for chunk in response])
+
+    return _submit_cached(project_id, settings, params, call)
+
+
+def _request_params(params: dict) -> dict:
+    """ Map legacy deployment_id to deployment name expected by AzureOpenAI """
+    params.pop('model', None)
+    params['model'] = params.pop('deployment_id')
+    return params
+
+
+def _prepare_chat_from_request(settings: dict, request_data: dict):
     params = ChatCompletionRequestBody.validate(request_data).dict(exclude_unset=True)
-    settings = IntegrationModel.parse_obj(settings)
-    init_settings = init_openai(settings, project_id)
+    settings = parse_settings(settings)
 
     token_limit = settings.get_token_limit(params['deployment_id'])
     max_tokens = params.get('max_tokens', 0)
@@ -295,32 +541,99 @@ def predict_chat_from_request(project_id: int, settings: dict, request_data: dic
             params['messages'], params['deployment_id'], max_tokens, token_limit
             )
 
-    return ChatCompletion.create(**params, **init_settings)
+    return settings, _request_params(params)
 
 
-def predict_from_request(project_id: int, settings: dict, request_data: dict) -> str:
+def predict_chat_from_request(project_id: int, settings: dict, request_data: dict) -> str:
+    settings, params = _prepare_chat_from_request(settings, request_data)
+    clients = init_clients(settings, project_id, params['model'])
+
+    if params.get('stream'):
+        return _dump_stream(_create(clients, 'chat.completions', params))
+    return _cached(
+        project_id, settings, params,
+        lambda: _create(clients, 'chat.completions', params).model_dump(),
+    )
+
+
+def submit_chat_from_request(project_id: int, settings: dict, request_data: dict) -> Future:
+    """ Async engine variant of predict_chat_from_request, non-streaming requests only """
+    settings, params = _prepare_chat_from_request(settings, request_data)
+    clients = init_clients(settings, project_id, params['model'], pool=async_client_pool)
+
+    async def call():
+        response = await _acreate(clients, 'chat.completions', params)
+        return response.model_dump()
+
+    return _submit_cached(project_id, settings, params, call)
+
+
+def _prepare_from_request(settings: dict, request_data: dict):
     params = CompletionRequestBody.validate(request_data).dict(exclude_unset=True)
-    settings = IntegrationModel.parse_obj(settings)
-    init_settings = init_openai(settings, project_id)
-    return Completion.create(**params, **init_settings)
+    settings = parse_settings(settings)
+    return settings, _request_params(params)
 
 
-def predict_text(project_id: int, settings: dict, prompt_struct: dict) -> str:
-    settings = IntegrationModel.parse_obj(settings)
-    init_settings = init_openai(settings, project_id)
-
-    text_prompt = prerare_text_prompt(prompt_struct)
-
-    response = Completion.create(
-        engine=settings.model_name,
-        temperature=settings.temperature,
-        max_tokens=settings.max_tokens,
-        top_p=settings.top_p,
-        prompt=text_prompt,
-        **init_settings
+def predict_from_request(project_id: int, settings: dict, request_data: dict) -> str:
+    settings, params = _prepare_from_request(settings, request_data)
+    clients = init_clients(settings, project_id, params['model'])
+
+    if params.get('stream'):
+        return _dump_stream(_create(clients, 'completions', params))
+    return _cached(
+        project_id, settings, params,
+        lambda: _create(clients, 'completions', params).model_dump(),
     )
 
-    content = response['choices'][0]['text']
+
+def submit_from_request(project_id: int, settings: dict, request_data: dict) -> Future:
+    """ Async engine variant of predict_from_request, non-streaming requests only """
+    settings, params = _prepare_from_request(settings, request_data)
+    clients = init_clients(settings, project_id, params['model'], pool=async_client_pool)
+
+    async def call():
+        response = await _acreate(clients, 'completions', params)
+        return response.model_dump()
+
+    return _submit_cached(project_id, settings, params, call)
+
+
+def _prepare_text(settings: dict, prompt_struct: dict):
+    settings = parse_settings(settings)
+
+    params = {
+        'model': settings.model_name,
+        'temperature': settings.temperature,
+        'max_tokens': settings.max_tokens,
+        'top_p': settings.top_p,
+        'prompt': prerare_text_prompt(prompt_struct),
+    }
+    return settings, params
+
+
+def _text_result(response):
+    content = response.choices[0].text
     log.info('completion_response %s', content)
 
     return prepare_text_result(content)
+
+
+def predict_text(project_id: int, settings: dict, prompt_struct: dict) -> str:
+    settings, params = _prepare_text(settings, prompt_struct)
+    clients = init_clients(settings, project_id, params['model'])
+
+    return _cached(
+        project_id, settings, params,
+        lambda: _text_result(_create(clients, 'completions', params)),
+    )
+
+
+def submit_text(project_id: int, settings: dict, prompt_struct: dict) -> Future:
+    """ Async engine variant of predict_text """
+    settings, params = _prepare_text(settings, prompt_struct)
+    clients = init_clients(settings, project_id, params['model'], pool=async_client_pool)
+
+    async def call():
+        return _text_result(await _acreate(clients, 'completions', params))
+
+    return _submit_cached(project_id, settings, params, call)